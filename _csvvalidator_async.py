@@ -0,0 +1,320 @@
+"""
+Asynchronous validation, see `CSVValidator.aivalidate`.
+
+This module requires Python 3.6 or later, and is imported by the `csvvalidator`
+module where available.
+
+"""
+
+
+import asyncio
+from collections import deque
+from inspect import iscoroutinefunction
+from itertools import chain
+
+from csvvalidator import _RecordPolicy, _RecordView, _Stage, _function_name
+
+
+async def aivalidate(self, data,
+                     expect_header_row=True,
+                     ignore_lines=0,
+                     summarize=False,
+                     context=None,
+                     report_unexpected_exceptions=True,
+                     concurrency=100,
+                     window=1000,
+                     record_policy='reference'):
+    """
+    Validate `data` and return an asynchronous iterator over problems found.
+
+    Use this function rather than ivalidate() if records are read
+    asynchronously, or if any value check functions, value predicates, record
+    check functions or record predicates are coroutine functions. Coroutine
+    functions are awaited concurrently, for the records in a window of rows
+    read ahead of the problems reported, but problems are reported in the same
+    order as for ivalidate(). All other functions are applied as for
+    ivalidate(), one record at a time. Coroutine functions may only be used
+    with aivalidate().
+
+    Arguments
+    ---------
+
+    `data` - any source of row-oriented data, either an asynchronous iterable,
+    e.g., an asynchronous generator of lists of strings, or an iterable as for
+    ivalidate()
+
+    `concurrency` - the maximum number of coroutine functions being awaited
+    at any one time
+
+    `window` - the maximum number of records read but not yet reported on
+
+    `record_policy` - as for ivalidate(), except 'offset' is not supported
+
+    See ivalidate() for all other arguments.
+
+    """
+
+    assert concurrency > 0, 'concurrency must be positive'
+    assert window > 0, 'window must be positive'
+    assert record_policy != 'offset', 'offset record policy is not supported'
+    policy = _RecordPolicy(record_policy, data)
+    plan = self.compile()
+    unique_sets = self._init_unique_sets(plan) # used for unique checks
+    replay_plan, outcomes = _replay_plan(plan)
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = _aenumerate(data)
+    exhausted = False
+    pending = deque()
+    try:
+        while pending or not exhausted:
+            if not exhausted:
+                try:
+                    i, r = await rows.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    if replay_plan is plan:
+                        awaited = None # nothing to await
+                    else:
+                        awaited = _await_row(i, r, plan, replay_plan,
+                                             semaphore, expect_header_row,
+                                             ignore_lines)
+                    pending.append((i, r, awaited))
+            # report on records in order, once the window is full or the
+            # outcomes for the first record are ready
+            while pending and (exhausted or len(pending) > window or
+                               _done(pending[0][2])):
+                i, r, awaited = pending.popleft()
+                if isinstance(awaited, asyncio.Future):
+                    awaited = await awaited
+                outcomes.current = awaited
+                problem_generator = self._ivalidate_rows(
+                    replay_plan, ((i, r),), unique_sets, expect_header_row,
+                    ignore_lines, summarize, report_unexpected_exceptions,
+                    context)
+                for p in policy.apply(problem_generator):
+                    yield p
+    finally:
+        # don't leave work behind if the caller stops early
+        for i, r, awaited in pending:
+            if isinstance(awaited, asyncio.Future):
+                awaited.cancel()
+    for p in self._finish_unique_checks(plan, unique_sets, None, summarize,
+                                        context):
+        yield p
+    for p in self._apply_finally_assert_methods(plan.finally_assert_methods,
+                                                summarize,
+                                                report_unexpected_exceptions,
+                                                context):
+        yield p
+
+
+async def _aenumerate(data):
+    """Enumerate `data`, an asynchronous iterable or an iterable."""
+
+    i = 0
+    if hasattr(data, '__aiter__'):
+        async for r in data:
+            yield i, r
+            i += 1
+    else:
+        for r in data:
+            yield i, r
+            i += 1
+
+
+def _done(awaited):
+    return not isinstance(awaited, asyncio.Future) or awaited.done()
+
+
+class _Outcomes(object):
+    """The outcomes of calling the functions replayed for the current row."""
+
+    __slots__ = ('current',)
+
+    def __init__(self):
+        self.current = None
+
+
+class _Replay(object):
+    """
+    Stands in for `function` in a validation plan, returning or raising what
+    `function` returned or raised when it was called, or awaited, earlier.
+
+    """
+
+    def __init__(self, function, outcomes):
+        self.function = function
+        self.outcomes = outcomes
+        self.awaited = iscoroutinefunction(function)
+        # used to report unexpected exceptions
+        self.__name__ = _function_name(function)
+        self.__doc__ = getattr(function, '__doc__', None)
+
+    def __call__(self, *args):
+        ok, result = self.outcomes.current.pop(self)
+        if ok:
+            return result
+        raise result
+
+
+def _replay_plan(plan):
+    """
+    Return a copy of `plan` in which coroutine functions and skips are replaced
+    by `_Replay` functions, and the outcomes to be replayed, or return `plan`
+    unchanged if there are no coroutine functions.
+
+    """
+
+    outcomes = _Outcomes()
+    found = [False]
+    dependencies = dict(plan.dependencies)
+    # coroutine record level functions are not awaited on records with failed
+    # values they depend on, so the value functions on those columns are
+    # applied first, and also replayed
+    depended = set()
+    for f in chain(plan.record_checks.items,
+                   (item[0] for item in plan.record_predicates.items)):
+        if iscoroutinefunction(f):
+            depended.update(plan.dependencies.get(f, ()))
+
+    def replay(f, depended_on=False):
+        if iscoroutinefunction(f):
+            found[0] = True
+            r = _Replay(f, outcomes)
+            if f in plan.dependencies:
+                dependencies[r] = plan.dependencies[f]
+            return r
+        if depended_on:
+            return _Replay(f, outcomes)
+        return f
+
+    def replace(stage, fi):
+        items = list()
+        for item in stage.items:
+            if fi is None:
+                items.append(replay(item))
+            else:
+                item = list(item)
+                # value functions are at index 2, after the column index
+                item[fi] = replay(item[fi], fi == 2 and item[0] in depended)
+                items.append(tuple(item))
+        return _Stage(items, stage.item_moduli)
+
+    stages = dict(value_checks=replace(plan.value_checks, 2),
+                  value_predicates=replace(plan.value_predicates, 2),
+                  record_checks=replace(plan.record_checks, None),
+                  record_predicates=replace(plan.record_predicates, 0))
+    if not found[0]:
+        return plan, outcomes
+    # skips are applied before coroutine functions are awaited, to avoid
+    # awaiting them on records that are skipped, so are also replayed
+    stages['skips'] = tuple(_Replay(skip, outcomes) for skip in plan.skips)
+    stages['dependencies'] = dependencies
+    return plan.replace(**stages), outcomes
+
+
+def _await_row(i, r, plan, replay_plan, semaphore, expect_header_row,
+               ignore_lines):
+    """
+    Apply the skips, and the value functions replayed for record level
+    functions which depend on them, and start awaiting the coroutine functions
+    that `CSVValidator._ivalidate_rows` will apply on `r`, and return the
+    outcomes to be replayed, or a future of them.
+
+    """
+
+    outcomes = dict()
+    if (expect_header_row and i == ignore_lines) or i < ignore_lines:
+        return outcomes
+    skip = False
+    for replay in replay_plan.skips:
+        try:
+            result = replay.function(r)
+            outcomes[replay] = (True, result)
+            if result is True:
+                skip = True
+        except Exception as e:
+            outcomes[replay] = (False, e)
+    if skip:
+        return outcomes
+    value_calls = list()
+    n = len(r)
+    for stage in replay_plan.value_checks, replay_plan.value_predicates:
+        for item in stage.select(i):
+            fi, f = item[0], item[2]
+            if isinstance(f, _Replay) and fi < n:
+                if f.awaited:
+                    value_calls.append((f, r[fi]))
+                else:
+                    outcomes[f] = _call(f.function, r[fi])
+    record_calls = list()
+    for f in replay_plan.record_checks.select(i):
+        if isinstance(f, _Replay):
+            record_calls.append(f)
+    for item in replay_plan.record_predicates.select(i):
+        f = item[0]
+        if isinstance(f, _Replay):
+            record_calls.append(f)
+    if not value_calls and not record_calls:
+        return outcomes
+    rdict = _RecordView(plan.field_index, plan.field_keys, r)
+    record_calls = [(f, rdict) for f in record_calls]
+    if replay_plan.dependencies and any(f in replay_plan.dependencies
+                                        for f, arg in record_calls):
+        # the record level functions to await depend on the values
+        return asyncio.ensure_future(_await_dependent_calls(
+            i, r, replay_plan, value_calls, record_calls, outcomes,
+            semaphore))
+    return asyncio.ensure_future(_await_calls(value_calls + record_calls,
+                                              outcomes, semaphore))
+
+
+async def _await_dependent_calls(i, r, replay_plan, value_calls, record_calls,
+                                 outcomes, semaphore):
+    """
+    Await the coroutine value functions in `value_calls`, then those in
+    `record_calls` which do not depend on any failed values, as
+    `CSVValidator._ivalidate_rows` will apply them.
+
+    """
+
+    await _await_calls(value_calls, outcomes, semaphore)
+    failed = set()
+    n = len(r)
+    for stage, predicates in ((replay_plan.value_checks, False),
+                              (replay_plan.value_predicates, True)):
+        for item in stage.select(i):
+            fi, f = item[0], item[2]
+            if isinstance(f, _Replay) and fi < n:
+                ok, result = outcomes[f]
+                if not ok or (predicates and not result):
+                    failed.add(fi)
+    if failed:
+        record_calls = [call for call in record_calls
+                        if failed.isdisjoint(
+                                replay_plan.dependencies.get(call[0], ()))]
+    return await _await_calls(record_calls, outcomes, semaphore)
+
+
+def _call(function, arg):
+    try:
+        return True, function(arg)
+    except Exception as e:
+        return False, e
+
+
+async def _await_calls(calls, outcomes, semaphore):
+    results = await asyncio.gather(*(_await_call(f.function, arg, semaphore)
+                                     for f, arg in calls))
+    for (f, arg), outcome in zip(calls, results):
+        outcomes[f] = outcome
+    return outcomes
+
+
+async def _await_call(function, arg, semaphore):
+    async with semaphore:
+        try:
+            return True, await function(arg)
+        except Exception as e:
+            return False, e
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+
+"""
+An executable Python script measuring the throughput of the CSVValidator module.
+
+Synthetic data are generated deterministically, using the same fields as the
+example.py script, and each benchmark validates the data with one kind of check
+or one way of validating, reporting rows per second and peak memory. Results
+can be saved as a baseline, and later results for data generated with the same
+options compared with it to find regressions, e.g.::
+
+    $ python benchmark.py --rows 100000 --save baseline.json
+    $ python benchmark.py --rows 100000 --compare baseline.json
+
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+from csvvalidator import CSVValidator, enumeration, number_range_inclusive,\
+    match_pattern, datetime_string, datetime_range_inclusive, RecordError
+
+try:
+    import tracemalloc
+except ImportError: # Python 2
+    tracemalloc = None
+    import resource
+
+
+FIELD_NAMES = (
+               'study_id',
+               'patient_id',
+               'gender',
+               'age_years',
+               'age_months',
+               'date_inclusion'
+               )
+
+
+def generate(rows, columns=len(FIELD_NAMES), error_rate=0.01, cardinality=None,
+             seed=0):
+    """
+    Generate synthetic data with the same fields as the example.py script,
+    returning a list of records, starting with a header row.
+
+    Arguments
+    ---------
+
+    `rows` - the number of records, not including the header row
+
+    `columns` - the number of fields, at least 6; any fields after those of the
+    example are named 'extra_1', 'extra_2', ...
+
+    `error_rate` - the fraction of records in which one value is not valid
+
+    `cardinality` - if given, the number of distinct patient ids, otherwise all
+    patient ids are distinct
+
+    `seed` - the seed for the random number generator, so the same arguments
+    always generate the same data
+
+    """
+
+    assert columns >= len(FIELD_NAMES), 'too few columns'
+    rng = random.Random(seed)
+    extra = tuple('extra_%s' % (j + 1)
+                  for j in range(columns - len(FIELD_NAMES)))
+    data = [FIELD_NAMES + extra]
+    start = date(2010, 1, 1)
+    for i in range(rows):
+        if cardinality is None:
+            patient_id = i
+        else:
+            patient_id = rng.randrange(cardinality)
+        age_years = rng.randint(1, 100)
+        r = [str(i % 10),
+             str(patient_id),
+             rng.choice('MF'),
+             str(age_years),
+             str(age_years * 12 + rng.randint(0, 11)),
+             (start + timedelta(days=rng.randint(0, 3000))).isoformat()]
+        r.extend(str(rng.randint(0, 1000)) for e in extra)
+        if rng.random() < error_rate:
+            # make one value invalid
+            j = rng.randrange(len(FIELD_NAMES))
+            r[j] = ('x', 'x', 'X', '121', 'x', '2010-13-01')[j]
+        data.append(r)
+    return data
+
+
+def create_validator(field_names=FIELD_NAMES):
+    """
+    Create a validator like the example.py script, for data with the given
+    `field_names`, starting with those of the example.
+
+    """
+
+    validator = CSVValidator(field_names)
+    validator.add_header_check('EX1', 'bad header')
+    validator.add_record_length_check('EX2', 'unexpected record length')
+    validator.add_value_check('study_id', int,
+                              'EX3', 'study id must be an integer')
+    validator.add_value_check('patient_id', int,
+                              'EX4', 'patient id must be an integer')
+    validator.add_value_check('gender', enumeration('M', 'F'),
+                              'EX5', 'invalid gender')
+    validator.add_value_check('age_years', number_range_inclusive(0, 120, int),
+                              'EX6', 'invalid age in years')
+    validator.add_value_check('date_inclusion', datetime_string('%Y-%m-%d'),
+                              'EX7', 'invalid date')
+
+    def check_age_variables(r):
+        age_years = int(r['age_years'])
+        age_months = int(r['age_months'])
+        valid = (age_months >= age_years * 12 and
+                 age_months % age_years < 12)
+        if not valid:
+            raise RecordError('EX8', 'invalid age variables')
+    validator.add_record_check(check_age_variables)
+
+    return validator
+
+
+def _single(add):
+    """Return a function creating a validator with a single check."""
+
+    def create(field_names=FIELD_NAMES):
+        validator = CSVValidator(field_names)
+        add(validator)
+        return validator
+    return create
+
+
+def _check_age(r):
+    if int(r['age_months']) < int(r['age_years']) * 12:
+        raise RecordError
+
+
+# validators with a single check of each kind
+CHECKS = (
+    ('header check',
+     _single(lambda v: v.add_header_check())),
+    ('record length check',
+     _single(lambda v: v.add_record_length_check())),
+    ('value check int',
+     _single(lambda v: v.add_value_check('study_id', int))),
+    ('value check enumeration',
+     _single(lambda v: v.add_value_check('gender', enumeration('M', 'F')))),
+    ('value check number range',
+     _single(lambda v: v.add_value_check(
+         'age_years', number_range_inclusive(0, 120, int)))),
+    ('value check pattern',
+     _single(lambda v: v.add_value_check('patient_id',
+                                         match_pattern(r'[0-9]+$')))),
+    ('value check datetime',
+     _single(lambda v: v.add_value_check('date_inclusion',
+                                         datetime_string('%Y-%m-%d')))),
+    ('value check datetime range',
+     _single(lambda v: v.add_value_check('date_inclusion',
+                                         datetime_range_inclusive(
+                                             '2010-01-01', '2020-01-01',
+                                             '%Y-%m-%d')))),
+    ('value predicate',
+     _single(lambda v: v.add_value_predicate('gender', lambda g: g in 'MF'))),
+    ('record check',
+     _single(lambda v: v.add_record_check(_check_age))),
+    ('record predicate',
+     _single(lambda v: v.add_record_predicate(
+         lambda r: r['gender'] in 'MF'))),
+    ('unique check',
+     _single(lambda v: v.add_unique_check('patient_id'))),
+    ('unique check compound',
+     _single(lambda v: v.add_unique_check(('study_id', 'patient_id')))),
+    ('skip',
+     _single(lambda v: v.add_skip(lambda r: r[0] == '0'))),
+    )
+
+
+# ways of validating with the example validator
+METHODS = (
+    ('validate', lambda v, data: v.validate(data)),
+    ('ivalidate', lambda v, data: sum(1 for p in v.ivalidate(data))),
+    ('validate summarize', lambda v, data: v.validate(data, summarize=True)),
+    ('summarize', lambda v, data: v.summarize(data)),
+    ('validate columns', lambda v, data: v.validate_columns(data)),
+    )
+
+
+def benchmarks():
+    """
+    Return a list of (name, create, run) triples, where `create` returns a
+    validator given the field names of the data, and `run` validates data with
+    it.
+
+    """
+
+    validate = METHODS[0][1]
+    result = [('check: ' + name, create, validate) for name, create in CHECKS]
+    result.extend(('example: ' + name, create_validator, run)
+                  for name, run in METHODS)
+    return result
+
+
+def measure(create, run, data, repeat=3):
+    """
+    Run a benchmark `repeat` times, returning the rows per second of the fastest
+    run, and once more to return the peak memory allocated in bytes.
+
+    On Python 2, the peak memory is the increase in the peak resident memory of
+    this process, so is zero unless the benchmark uses more memory than all
+    previous benchmarks.
+
+    """
+
+    field_names = tuple(data[0])
+    best = None
+    for k in range(repeat):
+        validator = create(field_names)
+        gc.collect()
+        start = time.time()
+        run(validator, data)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # memory is measured separately, as tracing allocations takes time
+    validator = create(field_names)
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        run(validator, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        run(validator, data)
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = (after - before) * 1024 # kilobytes on Linux
+    rows = len(data) - 1
+    return rows / max(best, 1e-9), peak
+
+
+# the options which determine the data generated, saved with the results
+OPTIONS = ('rows', 'columns', 'error_rate', 'cardinality', 'seed')
+
+
+def mismatched_options(options, baseline_options):
+    """
+    Return the names of the `options` which differ from those the baseline was
+    saved with, as results for different data can't be compared.
+
+    """
+
+    return [k for k in OPTIONS if options[k] != baseline_options.get(k)]
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the names of benchmarks in `results` which ran at less than
+    (1 - `tolerance`) times the rows per second in `baseline`.
+
+    """
+
+    regressions = list()
+    for name in sorted(results):
+        if name in baseline:
+            if results[name]['rows_per_sec'] < (1 - tolerance) * baseline[name]['rows_per_sec']:
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    """Main function."""
+
+    # define a command-line argument parser
+    description = 'Measure the throughput of CSV validation.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-n', '--rows',
+                        dest='rows',
+                        type=int,
+                        default=100000,
+                        help='the number of rows of data to generate')
+    parser.add_argument('-c', '--columns',
+                        dest='columns',
+                        type=int,
+                        default=len(FIELD_NAMES),
+                        help='the number of columns of data to generate')
+    parser.add_argument('-e', '--error-rate',
+                        dest='error_rate',
+                        type=float,
+                        default=0.01,
+                        help='the fraction of rows with an invalid value')
+    parser.add_argument('-k', '--cardinality',
+                        dest='cardinality',
+                        type=int,
+                        default=None,
+                        help='the number of distinct patient ids, defaults to one per row')
+    parser.add_argument('-s', '--seed',
+                        dest='seed',
+                        type=int,
+                        default=0,
+                        help='the seed for generating data')
+    parser.add_argument('-r', '--repeat',
+                        dest='repeat',
+                        type=int,
+                        default=3,
+                        help='the number of times to run each benchmark')
+    parser.add_argument('-m', '--match',
+                        dest='match',
+                        default='',
+                        help='only run benchmarks whose name contains this text')
+    parser.add_argument('--save',
+                        dest='save',
+                        metavar='FILE',
+                        help='save the results as a baseline to FILE')
+    parser.add_argument('--compare',
+                        dest='compare',
+                        metavar='FILE',
+                        help='compare the results with the baseline in FILE')
+    parser.add_argument('--tolerance',
+                        dest='tolerance',
+                        type=float,
+                        default=0.1,
+                        help='the fraction slower than the baseline which is a regression')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    options = dict((k, getattr(args, k)) for k in OPTIONS)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        mismatched = mismatched_options(options, saved['options'])
+        if mismatched:
+            parser.error('the baseline in %s was saved with different options: '
+                         '%s' % (args.compare, ', '.join(
+                             '%s=%s' % (k, saved['options'].get(k))
+                             for k in mismatched)))
+        baseline = saved['results']
+    data = generate(args.rows, args.columns, args.error_rate,
+                    args.cardinality, args.seed)
+
+    results = dict()
+    sys.stdout.write('%-40s %14s %14s %10s\n'
+                     % ('benchmark', 'rows/sec', 'peak memory', 'change'))
+    for name, create, run in benchmarks():
+        if args.match not in name:
+            continue
+        rows_per_sec, peak = measure(create, run, data, args.repeat)
+        results[name] = {'rows_per_sec': rows_per_sec, 'peak_memory': peak}
+        change = ''
+        if baseline is not None and name in baseline:
+            change = '%+.1f%%' % (100.0 * (rows_per_sec /
+                                           baseline[name]['rows_per_sec'] - 1))
+        sys.stdout.write('%-40s %14.0f %13.1fM %10s\n'
+                         % (name, rows_per_sec, peak / 1e6, change))
+        sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'options': options, 'results': results}, f, indent=2,
+                      sort_keys=True)
+
+    # decide how to exit
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name in regressions:
+            sys.stdout.write('regression: %s\n' % name)
+        if regressions:
+            sys.exit(1)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
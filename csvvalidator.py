@@ -78,8 +78,42 @@ see the example.py and tests.py modules in the source code repository.
 """
 
 
+import copy
+import csv
+import hashlib
+import heapq
+import inspect
+import io
+import math
+import multiprocessing
+import operator
+import os
 import re
+import sys
+import tempfile
+from array import array
+from collections import Counter, OrderedDict, deque
+from functools import partial
 from datetime import datetime
+from itertools import islice
+from timeit import default_timer
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError: # Python 2
+    from collections import Mapping, MutableMapping
+try:
+    import cPickle as pickle
+except ImportError: # Python 3
+    import pickle
+try:
+    import numpy as np
+except ImportError: # NumPy is optional
+    np = None
+
+
+_PY2 = sys.version_info[0] == 2
+if not _PY2:
+    basestring = str
 
 
 UNEXPECTED_EXCEPTION = 0
@@ -107,6 +141,128 @@ MESSAGES = {
             }
 
 
+class Profile(object):
+    """
+    Statistics on the calls made to each check function, predicate, unique
+    check, skip and method of a validator during validation, see the `profile`
+    argument to `CSVValidator.ivalidate`.
+
+    For each, the statistics are the number of calls, the total and maximum
+    time taken by a call in seconds, the number of calls which found a problem
+    (or, for a skip, skipped a record) and the number of calls which raised an
+    unexpected exception.
+
+    """
+
+    STATISTICS = ('calls', 'time', 'max_time', 'failures', 'exceptions')
+
+    # the stages of a validation plan in the order they are applied, with the
+    # kind of check in each
+    _KINDS = (('skips', 'skip'),
+              ('each_methods', 'each method'),
+              ('value_checks', 'value check'),
+              ('value_predicates', 'value predicate'),
+              ('record_checks', 'record check'),
+              ('record_predicates', 'record predicate'),
+              ('unique_checks', 'unique check'),
+              ('check_methods', 'check method'),
+              ('assert_methods', 'assert method'),
+              ('finally_assert_methods', 'finally assert method'))
+
+
+    def __init__(self, plan):
+        self._plan = plan
+        self._stats = dict()
+
+
+    def measure(self, plan, unique_sets):
+        """
+        Return a copy of `plan` and `unique_sets` which record statistics in
+        this profile.
+
+        """
+
+        names = [t[0] for t in _ValidationPlan._MEASURED]
+        plan, self._stats = plan.measured(names)
+        stats = [_CheckStats() for values in unique_sets]
+        self._stats['unique_checks'] = stats
+        unique_sets = [_MeasuredKeys(values, s)
+                       for values, s in zip(unique_sets, stats)]
+        return plan, unique_sets
+
+
+    def _entries(self):
+        """
+        Iterate over (kind, name, statistics) triples, in the order checks are
+        applied.
+
+        """
+
+        plan = self._plan
+        for name, kind in Profile._KINDS:
+            stage = getattr(plan, name)
+            for item, s in zip(getattr(stage, 'items', stage), self._stats[name]):
+                if name == 'unique_checks':
+                    description = str(item[0])
+                elif name in ('value_checks', 'value_predicates'):
+                    description = '%s: %s' % (item[1], _function_name(item[2]))
+                elif name == 'record_predicates':
+                    description = _function_name(item[0])
+                else:
+                    description = _function_name(item)
+                yield kind, description, s
+
+
+    def as_dict(self):
+        """
+        Return a dictionary mapping (kind, name) pairs, e.g., ('value check',
+        'foo: int'), to dictionaries of statistics, combined for checks of the
+        same kind and name.
+
+        """
+
+        d = dict()
+        for kind, name, s in self._entries():
+            stats = d.get((kind, name))
+            if stats is None:
+                d[(kind, name)] = dict((k, getattr(s, k))
+                                       for k in Profile.STATISTICS)
+            else:
+                for k in Profile.STATISTICS:
+                    if k == 'max_time':
+                        stats[k] = max(stats[k], s.max_time)
+                    else:
+                        stats[k] += getattr(s, k)
+        return d
+
+
+    def as_table(self):
+        """
+        Return a list of rows, starting with a header row, with the statistics
+        for each check in the order checks are applied.
+
+        """
+
+        table = [('kind', 'name') + Profile.STATISTICS]
+        for kind, name, s in self._entries():
+            table.append((kind, name) + tuple(getattr(s, k)
+                                              for k in Profile.STATISTICS))
+        return table
+
+
+    def write(self, file):
+        """
+        Write the statistics as a text table to `file`, slowest checks first.
+
+        """
+
+        rows = sorted(self.as_table()[1:], key=lambda row: -row[3])
+        file.write('%-24s %-32s %10s %12s %12s %10s %10s\n'
+                   % (('kind', 'name') + Profile.STATISTICS))
+        for row in rows:
+            file.write('%-24s %-32s %10d %12.6f %12.6f %10d %10d\n' % row)
+
+
 class RecordError(Exception):
     """Exception representing a validation problem in a record."""
 
@@ -125,6 +281,234 @@ class RecordError(Exception):
         return repr((self.code, self.message, self.details))
 
 
+class Problem(object):
+    """
+    A validation problem, which can be used as a dictionary with keys such as
+    'code', 'message', 'row' and 'record', as well as via attributes.
+
+    Only the keys relevant to a problem are present. To save memory, a problem
+    stores its values in slots rather than a dictionary, and the message for an
+    unexpected exception and the description of the function which raised it
+    are only formatted when they are needed. Similarly, if a problem has an
+    'offset' rather than a 'record', see the `record_policy` argument to
+    `CSVValidator.ivalidate`, the record is read from the file when needed.
+
+    """
+
+    __slots__ = ('code', 'row', 'column', 'field', 'value', 'offset', 'key',
+                 'length', 'missing', 'unexpected', 'details', 'exception',
+                 'context', '_message', '_function', '_record', '_source',
+                 '_extra')
+
+    # keys in the order they are listed
+    KEYS = ('code', 'message', 'row', 'column', 'field', 'value', 'record',
+            'offset', 'key', 'length', 'missing', 'unexpected', 'details',
+            'exception', 'function', 'context')
+
+    # the attributes any of which make a key present, if not the key itself
+    _PRESENT = {'message': ('_message', 'exception'),
+                'function': ('_function',),
+                'record': ('_record', '_source')}
+
+    __hash__ = None # problems are mutable
+
+
+    def __init__(self, code=None, **kwargs):
+        self.code = code
+        for k in kwargs:
+            self[k] = kwargs[k]
+
+
+    @property
+    def message(self):
+        try:
+            return self._message
+        except AttributeError:
+            e = self.exception # raises AttributeError if not present
+            return MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
+
+
+    @message.setter
+    def message(self, message):
+        self._message = message
+
+
+    @property
+    def record(self):
+        try:
+            return self._record
+        except AttributeError:
+            source = self._source # raises AttributeError if not present
+            return source.read_record(self.offset)
+
+
+    @record.setter
+    def record(self, record):
+        self._record = record
+
+
+    @property
+    def function(self):
+        """A description of the function which raised `exception`."""
+
+        f = self._function
+        if isinstance(f, basestring):
+            return f
+        return '%s: %s' % (_function_name(f), f.__doc__)
+
+
+    @function.setter
+    def function(self, function):
+        self._function = function
+
+
+    def __getitem__(self, key):
+        if key in Problem.KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        else:
+            try:
+                return self._extra[key]
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+
+    def __setitem__(self, key, value):
+        if key in Problem.KEYS:
+            setattr(self, key, value)
+        else:
+            try:
+                self._extra[key] = value
+            except AttributeError:
+                self._extra = {key: value}
+
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in Problem.KEYS:
+            # delete whatever makes the key present
+            for a in Problem._PRESENT.get(key, (key,)):
+                if hasattr(self, a):
+                    delattr(self, a)
+        else:
+            del self._extra[key]
+
+
+    def __contains__(self, key):
+        if key in Problem.KEYS:
+            for a in Problem._PRESENT.get(key, (key,)):
+                if hasattr(self, a):
+                    return True
+            return False
+        return key in getattr(self, '_extra', ())
+
+
+    def __iter__(self):
+        for key in Problem.KEYS:
+            if key in self:
+                yield key
+        extra = getattr(self, '_extra', None)
+        if extra:
+            for key in extra:
+                yield key
+
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+
+    def __eq__(self, other):
+        if isinstance(other, (Problem, Mapping)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+    def __getstate__(self):
+        # functions are described, as they may not be picklable, but records
+        # are not read
+        state = dict((k, self[k]) for k in self if k != 'record')
+        if hasattr(self, '_record'):
+            state['record'] = self._record
+        if hasattr(self, '_source'):
+            state['_source'] = self._source
+        return state
+
+
+    def __setstate__(self, state):
+        for k in state:
+            if k == '_source':
+                self._source = state[k]
+            else:
+                self[k] = state[k]
+
+
+    def keys(self):
+        return list(self)
+
+
+    def values(self):
+        return [self[k] for k in self]
+
+
+    def items(self):
+        return [(k, self[k]) for k in self]
+
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+
+    def copy(self):
+        p = Problem()
+        p.__setstate__(self.__getstate__())
+        return p
+
+
+MutableMapping.register(Problem)
+
+
 class CSVValidator(object):
     """
     Instances of this class can be configured to run a variety of different
@@ -133,6 +517,11 @@ class CSVValidator(object):
     """
 
 
+    # prefixes of the names of methods that sub-classes may define to be
+    # invoked during validation, discovered once per class
+    _METHOD_PREFIXES = ('each', 'check', 'assert', 'finally_assert')
+
+
     def __init__(self, field_names):
         """
         Instantiate a `CSVValidator`, supplying expected `field_names` as a
@@ -149,6 +538,7 @@ class CSVValidator(object):
         self._record_predicates = []
         self._unique_checks = []
         self._skips = []
+        self._plan = None
 
 
     def add_header_check(self,
@@ -170,6 +560,7 @@ class CSVValidator(object):
 
         t = code, message
         self._header_checks.append(t)
+        self._plan = None
 
 
     def add_record_length_check(self,
@@ -195,12 +586,15 @@ class CSVValidator(object):
 
         t = code, message, modulus
         self._record_length_checks.append(t)
+        self._plan = None
 
 
     def add_value_check(self, field_name, value_check,
                         code=VALUE_CHECK_FAILED,
                         message=MESSAGES[VALUE_CHECK_FAILED],
-                        modulus=1):
+                        modulus=1,
+                        memoize=False,
+                        cache_size=1024):
         """
         Add a value check function for the specified field.
 
@@ -221,20 +615,33 @@ class CSVValidator(object):
         `modulus` - apply the check to every nth record, defaults to 1 (check
         every record)
 
+        `memoize` - if true, remember the outcome of the check for the most
+        recently checked distinct values, so checking a value again only costs
+        a dictionary lookup - useful for fields with few distinct values, and
+        only for check functions without side effects, see also `cache_info`
+
+        `cache_size` - if `memoize` is true, the number of distinct values to
+        remember the outcome for
+
         """
 
         # guard conditions
         assert field_name in self._field_names, 'unexpected field name: %s' % field_name
         assert callable(value_check), 'value check must be a callable function'
+        if memoize:
+            value_check = _Memoized(value_check, cache_size)
 
         t = field_name, value_check, code, message, modulus
         self._value_checks.append(t)
+        self._plan = None
 
 
     def add_value_predicate(self, field_name, value_predicate,
                         code=VALUE_PREDICATE_FALSE,
                         message=MESSAGES[VALUE_PREDICATE_FALSE],
-                        modulus=1):
+                        modulus=1,
+                        memoize=False,
+                        cache_size=1024):
         """
         Add a value predicate function for the specified field.
 
@@ -259,16 +666,43 @@ class CSVValidator(object):
         `modulus` - apply the check to every nth record, defaults to 1 (check
         every record)
 
+        `memoize` - if true, remember the outcome of the predicate for the most
+        recently checked distinct values, see `add_value_check`
+
+        `cache_size` - if `memoize` is true, the number of distinct values to
+        remember the outcome for
+
         """
 
         assert field_name in self._field_names, 'unexpected field name: %s' % field_name
         assert callable(value_predicate), 'value predicate must be a callable function'
+        if memoize:
+            value_predicate = _Memoized(value_predicate, cache_size)
 
         t = field_name, value_predicate, code, message, modulus
         self._value_predicates.append(t)
+        self._plan = None
+
+
+    def cache_info(self):
+        """
+        Return a list of (field name, function, hits, misses, size) tuples, one
+        for each memoized value check and value predicate in the order they were
+        added, where `hits` and `misses` count the values checked which were
+        and were not remembered, and `size` is the number of values remembered.
+
+        """
+
+        info = list()
+        for t in self._value_checks + self._value_predicates:
+            field_name, f = t[0], t[1]
+            if isinstance(f, _Memoized):
+                info.append((field_name, f.function, f.hits, f.misses,
+                             len(f.cache)))
+        return info
 
 
-    def add_record_check(self, record_check, modulus=1):
+    def add_record_check(self, record_check, modulus=1, fields=None):
         """
         Add a record check function.
 
@@ -277,23 +711,32 @@ class CSVValidator(object):
 
         `record_check` - a function that accepts a single argument (a record as
         a dictionary of values indexed by field name) and raises a
-        `RecordError` if the record is not valid
+        `RecordError` if the record is not valid; the dictionary is a view of
+        the record, call its `copy` method for a plain dictionary
 
         `modulus` - apply the check to every nth record, defaults to 1 (check
         every record)
 
+        `fields` - the names of the fields the check depends on, if given, or
+        if declared with `depends_on`, in which case the check is not applied
+        to records in which a value check or value predicate on any of these
+        fields has failed
+
         """
 
         assert callable(record_check), 'record check must be a callable function'
+        fields = self._check_dependencies(record_check, fields)
 
-        t = record_check, modulus
+        t = record_check, fields, modulus
         self._record_checks.append(t)
+        self._plan = None
 
 
     def add_record_predicate(self, record_predicate,
                         code=RECORD_PREDICATE_FALSE,
                         message=MESSAGES[RECORD_PREDICATE_FALSE],
-                        modulus=1):
+                        modulus=1,
+                        fields=None):
         """
         Add a record predicate function.
 
@@ -316,20 +759,80 @@ class CSVValidator(object):
         `modulus` - apply the check to every nth record, defaults to 1 (check
         every record)
 
+        `fields` - the names of the fields the predicate depends on, see
+        `add_record_check`
+
         """
 
         assert callable(record_predicate), 'record predicate must be a callable function'
+        fields = self._check_dependencies(record_predicate, fields)
 
-        t = record_predicate, code, message, modulus
+        t = record_predicate, code, message, fields, modulus
         self._record_predicates.append(t)
+        self._plan = None
+
+
+    def _check_dependencies(self, f, fields):
+        """
+        Return the names of the fields `f` depends on, as given or as declared
+        with `depends_on`, as a tuple, or None.
+
+        """
+
+        if fields is None:
+            fields = getattr(f, 'depends_on', None)
+        if fields is None:
+            return None
+        if isinstance(fields, basestring):
+            fields = (fields,)
+        for field_name in fields:
+            assert field_name in self._field_names, 'unexpected field name: %s' % field_name
+        return tuple(fields)
 
 
     def add_unique_check(self, key,
                         code=UNIQUE_CHECK_FAILED,
-                        message=MESSAGES[UNIQUE_CHECK_FAILED]):
+                        message=MESSAGES[UNIQUE_CHECK_FAILED],
+                        fingerprint=None,
+                        confirm=True,
+                        max_keys=None,
+                        tempdir=None,
+                        bloom=None):
         """
         Add a unique check on a single column or combination of columns.
 
+        By default, every distinct key found is kept in memory. If
+        `fingerprint` is given, only a fixed size fingerprint of each key is
+        kept, in a compact hash table, which uses much less memory for large
+        numbers of keys. Two different keys may then have the same fingerprint,
+        so a key with the same fingerprint as a key found earlier is only a
+        candidate duplicate. If `confirm` is true and the data being validated
+        is a sequence, e.g., a list, or a file validated by `validate_file` or
+        `validate_parallel`, candidate duplicates are confirmed by comparing
+        with the key in the record where the fingerprint was first found, read
+        again from the file if need be. Otherwise, e.g., when validating a
+        `csv.reader`, a candidate duplicate is reported as a duplicate, and the
+        chance of any false positives among n distinct keys is about
+        n**2 / 2**(b + 1) for a fingerprint of b bits, i.e., about one in 900
+        for 200 million keys with 64 bits.
+
+        Alternatively, if `max_keys` is given, at most that many keys are kept
+        in memory, after which keys are written as a sorted run to a temporary
+        file, and keys are kept in memory again until there are `max_keys` more.
+        Only duplicates of keys kept in memory at the time are found as each
+        record is validated. Once all records have been validated, the runs are
+        merged to find all other duplicates, which are reported after all
+        other problems found in records, in order of key rather than row. These
+        problems only include the record itself if the data being validated is
+        a sequence, e.g., a list.
+
+        If `bloom` is given, a Bloom filter sized for that many distinct keys is
+        checked first, and the keys kept, in any of the ways above, are only
+        looked up for keys which the filter finds may have been seen before,
+        about 1% of new keys. This is most useful with `max_keys`, as the runs
+        are then only merged if a key which may have been seen before is not one
+        of the keys in memory.
+
         Arguments
         ---------
 
@@ -342,6 +845,20 @@ class CSVValidator(object):
 
         `message` - problem message to report if a record is not valid
 
+        `fingerprint` - if given, the number of bits of each key's fingerprint to
+        keep, either 64 or 128
+
+        `confirm` - confirm candidate duplicates where possible, if
+        `fingerprint` is given
+
+        `max_keys` - if given, the maximum number of keys to keep in memory
+
+        `tempdir` - the directory for temporary files, if `max_keys` is given,
+        defaults to the system default
+
+        `bloom` - if given, the expected number of distinct keys, used to size a
+        Bloom filter
+
         """
 
         if isinstance(key, basestring):
@@ -349,8 +866,16 @@ class CSVValidator(object):
         else:
             for f in key:
                 assert f in self._field_names, 'unexpected field name: %s' % key
-        t = key, code, message
+        assert fingerprint in (None, 64, 128), 'fingerprint must be 64 or 128'
+        assert max_keys is None or max_keys > 0, 'max keys must be positive'
+        assert fingerprint is None or max_keys is None, \
+            'fingerprint and max keys cannot both be given'
+        assert bloom is None or bloom > 0, 'bloom must be positive'
+        options = {'fingerprint': fingerprint, 'confirm': confirm,
+                   'max_keys': max_keys, 'tempdir': tempdir, 'bloom': bloom}
+        t = key, code, message, options
         self._unique_checks.append(t)
+        self._plan = None
 
 
     def add_skip(self, skip):
@@ -363,6 +888,76 @@ class CSVValidator(object):
 
         assert callable(skip), 'skip must be a callable function'
         self._skips.append(skip)
+        self._plan = None
+
+
+    def compile(self):
+        """
+        Compile the checks added so far into an immutable validation plan, and
+        return the plan.
+
+        The plan holds the column index of every field a check refers to, and
+        groups checks by modulus, so that none of this work needs to be repeated
+        for each record. The plan is cached, compiled implicitly by `ivalidate`
+        if necessary, and discarded whenever another check or skip is added.
+
+        """
+
+        if self._plan is None:
+            self._plan = _ValidationPlan(self)
+        return self._plan
+
+
+    def _sync_plan(self):
+        """
+        Compile the checks added so far, see `compile`, and return the plan,
+        raising a TypeError if any are coroutine functions, which are only
+        awaited by `aivalidate`.
+
+        """
+
+        plan = self.compile()
+        names = plan.coroutine_functions()
+        if names:
+            raise TypeError('coroutine functions cannot be applied '
+                            'synchronously, use aivalidate: %s'
+                            % ', '.join(names))
+        return plan
+
+
+    def refresh_methods(self):
+        """
+        Rediscover the 'each', 'check', 'assert' and 'finally_assert' methods
+        of this validator.
+
+        These methods are discovered once per class, and once per compiled plan
+        for methods set as attributes of the instance, so call this if any such
+        methods are added after the validator has first been used.
+
+        """
+
+        cls = type(self)
+        if '_method_registry' in cls.__dict__:
+            del cls._method_registry
+        self._plan = None
+
+
+    @classmethod
+    def _discover_methods(cls):
+        """
+        Return a dictionary mapping method name prefixes to the names of the
+        matching attributes of this class, discovering them on first use.
+
+        """
+
+        registry = cls.__dict__.get('_method_registry')
+        if registry is None:
+            names = dir(cls)
+            registry = dict((prefix, tuple(a for a in names
+                                           if a.startswith(prefix)))
+                            for prefix in cls._METHOD_PREFIXES)
+            cls._method_registry = registry
+        return registry
 
 
     def validate(self, data,
@@ -371,10 +966,22 @@ class CSVValidator(object):
                  summarize=False,
                  limit=0,
                  context=None,
-                 report_unexpected_exceptions=True):
+                 report_unexpected_exceptions=True,
+                 executor=None,
+                 window=1000,
+                 fail_fast=False,
+                 stop_on_codes=None,
+                 record_policy='reference',
+                 adaptive=0,
+                 profile=False):
         """
         Validate `data` and return a list of validation problems found.
 
+        Validation stops as soon as `limit` problems have been found, or a
+        problem is found if `fail_fast` is true, or a problem with any of the
+        codes in `stop_on_codes` is found, without reading any more data. No
+        'finally_assert' methods are applied if validation stops early.
+
         Arguments
         ---------
 
@@ -400,16 +1007,23 @@ class CSVValidator(object):
         is true, any unexpected exceptions will be reported as validation
         problems; if False, unexpected exceptions will be handled silently.
 
+        `fail_fast` - stop validating as soon as a problem is found
+
+        `stop_on_codes` - stop validating as soon as a problem is found with
+        any of these codes, e.g., `{HEADER_CHECK_FAILED}`
+
+        See `ivalidate` for the `executor`, `window`, `record_policy`,
+        `adaptive` and `profile` arguments.
+
         """
 
-        problems = list()
         problem_generator = self.ivalidate(data, expect_header_row,
                                            ignore_lines, summarize, context,
-                                           report_unexpected_exceptions)
-        for i, p in enumerate(problem_generator):
-            if not limit or i < limit:
-                problems.append(p)
-        return problems
+                                           report_unexpected_exceptions,
+                                           executor, window, record_policy,
+                                           adaptive, profile)
+        return _collect_problems(problem_generator, 1 if fail_fast else limit,
+                                 stop_on_codes)
 
 
     def ivalidate(self, data,
@@ -417,7 +1031,12 @@ class CSVValidator(object):
                  ignore_lines=0,
                  summarize=False,
                  context=None,
-                 report_unexpected_exceptions=True):
+                 report_unexpected_exceptions=True,
+                 executor=None,
+                 window=1000,
+                 record_policy='reference',
+                 adaptive=0,
+                 profile=False):
         """
         Validate `data` and return a iterator over problems found.
 
@@ -447,18 +1066,132 @@ class CSVValidator(object):
         is true, any unexpected exceptions will be reported as validation
         problems; if False, unexpected exceptions will be handled silently.
 
+        `executor` - an executor, e.g., a
+        `concurrent.futures.ThreadPoolExecutor`, to apply record check
+        functions and record predicates with - useful if these functions wait
+        on I/O or release the GIL. Each function is submitted with its own view
+        of the record as a dictionary, so they must not depend on each other.
+        Problems are still reported in the same order as without an executor.
+
+        `window` - if an `executor` is given, the maximum number of record
+        check functions and record predicates submitted to it but not yet
+        reported on
+
+        `record_policy` - what problems keep of the record they were found in,
+        one of 'reference' to keep the record itself, 'copy' to keep a copy
+        of the record, e.g., if the data source reuses lists, 'none' to keep
+        nothing, or 'offset' to keep the byte offset of the record as
+        'offset', and read the record from the file again if 'record' is
+        needed. The 'offset' policy requires data which provides byte offsets,
+        e.g., as read by `validate_parallel`.
+
+        `adaptive` - if positive, count the calls made to and the problems found
+        by each value check, value predicate, record check and record predicate
+        on this many rows, then apply the checks of each of these kinds on all
+        remaining rows in order of the proportion of calls which found a
+        problem, i.e., checks which often fail first - useful with `fail_fast`
+        or `stop_on_codes`. Checks of different kinds are still applied in the
+        usual order, so problems are still reported row by row and kind by kind,
+        but within a row problems of the same kind are reported in the order the
+        checks were applied. This is the order the checks were added for the
+        first `adaptive` rows, and for the remaining rows is the order of the
+        proportion of calls which found a problem, with checks never applied,
+        e.g., because of their modulus, last, and ties in the order the checks
+        were added, so the order depends only on the data.
+
+        `profile` - if true, record statistics on the calls made to every check
+        function, predicate, unique check, skip and method as a `Profile`, set
+        as the `profile` attribute of this validator when validation starts
+
+        """
+
+        assert window > 0, 'window must be positive'
+        assert adaptive >= 0, 'adaptive must not be negative'
+        plan = self._sync_plan()
+        unique_sets = self._init_unique_sets(plan, data) # used for unique checks
+        if profile:
+            self.profile = Profile(plan)
+            plan, unique_sets = self.profile.measure(plan, unique_sets)
+        policy = _RecordPolicy(record_policy, data)
+        rows = policy.read_rows()
+        if adaptive:
+            problem_generator = self._ivalidate_adaptive(
+                    plan, rows, adaptive, unique_sets, expect_header_row,
+                    ignore_lines, summarize, report_unexpected_exceptions,
+                    context, executor=executor)
+        else:
+            problem_generator = self._ivalidate_rows(plan, rows, unique_sets,
+                                                     expect_header_row,
+                                                     ignore_lines, summarize,
+                                                     report_unexpected_exceptions,
+                                                     context, executor=executor)
+        problem_generator = policy.apply(problem_generator)
+        if executor is not None:
+            problem_generator = _resolve_deferred(problem_generator, window)
+        for p in problem_generator:
+            yield p
+        for p in self._finish_unique_checks(plan, unique_sets, data, summarize,
+                                            context):
+            yield p
+        for p in self._apply_finally_assert_methods(plan.finally_assert_methods,
+                                                    summarize,
+                                                    report_unexpected_exceptions,
+                                                    context):
+            yield p
+
+
+    def _ivalidate_adaptive(self, plan, rows, adaptive, *args, **kwargs):
+        """
+        Apply all checks except 'finally_assert' methods on `rows` as for
+        `_ivalidate_rows`, measuring value checks, value predicates, record
+        checks and record predicates on the first `adaptive` rows, then applying
+        them in order of the proportion of calls which found a problem, see
+        `ivalidate`.
+
+        """
+
+        measured, stats = plan.measured()
+        for p in self._ivalidate_rows(measured, islice(rows, adaptive), *args,
+                                      **kwargs):
+            yield p
+        for p in self._ivalidate_rows(plan.reordered(stats), rows, *args,
+                                      **kwargs):
+            yield p
+
+
+    def _ivalidate_rows(self, plan, rows, unique_sets,
+                        expect_header_row=True,
+                        ignore_lines=0,
+                        summarize=False,
+                        report_unexpected_exceptions=True,
+                        context=None,
+                        columnar=None,
+                        executor=None):
+        """
+        Apply all checks except 'finally_assert' methods on `rows`, an iterable
+        of (index, record) pairs, and return an iterator over problems found.
+
+        If `columnar` is given, it is a triple of dictionaries mapping row index
+        to the value check and value predicate problems already found for that
+        row, and to the column indices of the values which failed them, see
+        `ivalidate_batches`.
+
+        If `executor` is given, record checks and record predicates are
+        submitted to it, and a `_Deferred` problem list is yielded for each in
+        place of the problems found, see `_resolve_deferred`.
+
         """
 
-        unique_sets = self._init_unique_sets() # used for unique checks
-        for i, r in enumerate(data):
+        for i, r in rows:
             if expect_header_row and i == ignore_lines:
                 # r is the header row
-                for p in self._apply_header_checks(i, r, summarize, context):
+                for p in self._apply_header_checks(i, r, plan.header_checks,
+                                                   summarize, context):
                     yield p
             elif i >= ignore_lines:
                 # r is a data row
                 skip = False
-                for p in self._apply_skips(i, r, summarize,
+                for p in self._apply_skips(i, r, plan.skips, summarize,
                                                   report_unexpected_exceptions,
                                                   context):
                     if p is True:
@@ -466,452 +1199,2866 @@ class CSVValidator(object):
                     else:
                         yield p
                 if not skip:
-                    for p in self._apply_each_methods(i, r, summarize,
+                    # a single view of r as a dictionary is shared by all
+                    # record level functions
+                    rdict = _RecordView(plan.field_index, plan.field_keys, r)
+                    for p in self._apply_each_methods(i, r, rdict,
+                                                      plan.each_methods,
+                                                      summarize,
                                                       report_unexpected_exceptions,
                                                       context):
                         yield p # may yield a problem if an exception is raised
-                    for p in self._apply_value_checks(i, r, summarize,
-                                                      report_unexpected_exceptions,
-                                                      context):
+                    # column indices of values which fail, if any record level
+                    # checks depend on them
+                    failed = set() if plan.dependencies else None
+                    if columnar is None:
+                        value_problems = self._apply_value_checks(
+                                i, r, plan.value_checks.select(i), summarize,
+                                report_unexpected_exceptions, context, failed)
+                    else:
+                        value_problems = columnar[0].get(i, ())
+                    for p in value_problems:
                         yield p
-                    for p in self._apply_record_length_checks(i, r, summarize,
+                    for p in self._apply_record_length_checks(i, r,
+                                                              plan.record_length_checks.select(i),
+                                                              summarize,
                                                               context):
                         yield p
-                    for p in self._apply_value_predicates(i, r, summarize,
-                                                          report_unexpected_exceptions,
-                                                          context):
-                        yield p
-                    for p in self._apply_record_checks(i, r, summarize,
-                                                           report_unexpected_exceptions,
-                                                           context):
+                    if columnar is None:
+                        value_problems = self._apply_value_predicates(
+                                i, r, plan.value_predicates.select(i), summarize,
+                                report_unexpected_exceptions, context, failed)
+                    else:
+                        value_problems = columnar[1].get(i, ())
+                    for p in value_problems:
                         yield p
-                    for p in self._apply_record_predicates(i, r, summarize,
+                    record_checks = plan.record_checks.select(i)
+                    record_predicates = plan.record_predicates.select(i)
+                    check_methods = plan.check_methods
+                    assert_methods = plan.assert_methods
+                    if failed is not None and columnar is not None:
+                        failed.update(columnar[2].get(i, ()))
+                    if failed:
+                        # don't apply checks which depend on failed values
+                        record_checks = plan.unaffected(record_checks, failed)
+                        record_predicates = plan.unaffected(record_predicates,
+                                                            failed)
+                        check_methods = plan.unaffected(check_methods, failed)
+                        assert_methods = plan.unaffected(assert_methods, failed)
+                    if executor is None:
+                        for p in self._apply_record_checks(i, r, rdict,
+                                                           record_checks,
+                                                           summarize,
                                                            report_unexpected_exceptions,
                                                            context):
+                            yield p
+                        for p in self._apply_record_predicates(i, r, rdict,
+                                                               record_predicates,
+                                                               summarize,
+                                                               report_unexpected_exceptions,
+                                                               context):
+                            yield p
+                    else:
+                        # generators run when consumed, i.e., by the executor
+                        for apply, items in ((self._apply_record_checks,
+                                              record_checks),
+                                             (self._apply_record_predicates,
+                                              record_predicates)):
+                            for item in items:
+                                view = _RecordView(plan.field_index,
+                                                   plan.field_keys, r)
+                                problems = apply(i, r, view, (item,),
+                                                 summarize,
+                                                 report_unexpected_exceptions,
+                                                 context)
+                                yield _Deferred(executor.submit(list, problems))
+                    for p in self._apply_unique_checks(i, r, plan.unique_checks,
+                                                       unique_sets, summarize,
+                                                       context):
                         yield p
-                    for p in self._apply_unique_checks(i, r, unique_sets, summarize):
-                        yield p
-                    for p in self._apply_check_methods(i, r, summarize,
+                    for p in self._apply_check_methods(i, r, rdict,
+                                                       check_methods,
+                                                       summarize,
                                                        report_unexpected_exceptions,
                                                        context):
                         yield p
-                    for p in self._apply_assert_methods(i, r, summarize,
+                    for p in self._apply_assert_methods(i, r, rdict,
+                                                        assert_methods,
+                                                        summarize,
                                                         report_unexpected_exceptions,
                                                         context):
                         yield p
-        for p in self._apply_finally_assert_methods(summarize,
-                                                    report_unexpected_exceptions,
-                                                    context):
-            yield p
-
 
-    def _init_unique_sets(self):
-        """Initialise sets used for uniqueness checking."""
-
-        ks = dict()
-        for t in self._unique_checks:
-            key = t[0]
-            ks[key] = set() # empty set
-        return ks
 
+    def summarize(self, data,
+                  expect_header_row=True,
+                  ignore_lines=0,
+                  report_unexpected_exceptions=True,
+                  by_field=False,
+                  by_check=False):
+        """
+        Validate `data` and return a `collections.Counter` of the number of
+        problems found with each code.
+
+        The same checks are applied as for `validate`, but only the problems
+        found are counted, which is faster than reporting them. If `by_field`
+        or `by_check` is true, problems are counted by (code, field) or (code,
+        check) pairs, or by (code, field, check) triples if both are true,
+        rather than by code. The field is the field name for problems found by
+        value checks and value predicates, otherwise None. The check is the
+        function or method that found the problem, as it was added, or the key
+        of a unique check, as a tuple if the key is compound, or None for header
+        checks and record length checks.
 
-    def _apply_value_checks(self, i, r,
-                            summarize=False,
-                            report_unexpected_exceptions=True,
-                            context=None):
-        """Apply value check functions on the given record `r`."""
+        Arguments
+        ---------
 
-        for field_name, check, code, message, modulus in self._value_checks:
-            if i % modulus == 0: # support sampling
-                fi = self._field_names.index(field_name)
-                if fi < len(r): # only apply checks if there is a value
-                    value = r[fi]
-                    try:
-                        check(value)
-                    except ValueError:
-                        p = {'code': code}
-                        if not summarize:
-                            p['message'] = message
-                            p['row'] = i + 1
-                            p['column'] = fi + 1
-                            p['field'] = field_name
-                            p['value'] = value
-                            p['record'] = r
-                            if context is not None: p['context'] = context
-                        yield p
-                    except Exception as e:
-                        if report_unexpected_exceptions:
-                            p = {'code': UNEXPECTED_EXCEPTION}
-                            if not summarize:
-                                p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                                p['row'] = i + 1
-                                p['column'] = fi + 1
-                                p['field'] = field_name
-                                p['value'] = value
-                                p['record'] = r
-                                p['exception'] = e
-                                p['function'] = '%s: %s' % (check.__name__,
-                                                            check.__doc__)
-                                if context is not None: p['context'] = context
-                            yield p
+        `by_field` - count problems by field as well as by code
 
+        `by_check` - count problems by check as well as by code
 
-    def _apply_header_checks(self, i, r, summarize=False, context=None):
-        """Apply header checks on the given record `r`."""
+        See `validate` for all other arguments.
 
-        for code, message in self._header_checks:
-            if tuple(r) != self._field_names:
-                p = {'code': code}
-                if not summarize:
-                    p['message'] = message
-                    p['row'] = i + 1
-                    p['record'] = tuple(r)
-                    p['missing'] = set(self._field_names) - set(r)
-                    p['unexpected'] = set(r) - set(self._field_names)
-                    if context is not None: p['context'] = context
-                yield p
+        """
 
+        counts = Counter()
+        if by_field and by_check:
+            def count(code, field, check):
+                counts[(code, field, _registered(check))] += 1
+        elif by_field:
+            def count(code, field, check):
+                counts[(code, field)] += 1
+        elif by_check:
+            def count(code, field, check):
+                counts[(code, _registered(check))] += 1
+        else:
+            def count(code, field, check):
+                counts[code] += 1
+        plan = self._sync_plan()
+        unique_sets = self._init_unique_sets(plan, data) # used for unique checks
+        self._count_rows(plan, enumerate(data), unique_sets, count,
+                         expect_header_row, ignore_lines,
+                         report_unexpected_exceptions)
+        for (key, compound, fi, code, message), values in zip(plan.unique_checks,
+                                                              unique_sets):
+            for value, i in values.finish():
+                count(code, None, tuple(key) if compound else key)
+        for f in plan.finally_assert_methods:
+            try:
+                f()
+            except AssertionError as e:
+                count(_assertion_problem(e)[0], None, f)
+            except Exception:
+                if report_unexpected_exceptions:
+                    count(UNEXPECTED_EXCEPTION, None, f)
+        return counts
 
-    def _apply_record_length_checks(self, i, r, summarize=False, context=None):
-        """Apply record length checks on the given record `r`."""
 
-        for code, message, modulus in self._record_length_checks:
-            if i % modulus == 0: # support sampling
-                if len(r) != len(self._field_names):
-                    p = {'code': code}
-                    if not summarize:
-                        p['message'] = message
-                        p['row'] = i + 1
-                        p['record'] = r
-                        p['length'] = len(r)
-                        if context is not None: p['context'] = context
-                    yield p
+    def _count_rows(self, plan, rows, unique_sets, count,
+                    expect_header_row=True,
+                    ignore_lines=0,
+                    report_unexpected_exceptions=True):
+        """
+        Apply all checks except 'finally_assert' methods on `rows`, an iterable
+        of (index, record) pairs, as for `_ivalidate_rows`, but call
+        `count(code, field, check)` for each problem found rather than report
+        it, see `summarize`.
 
+        """
 
-    def _apply_value_predicates(self, i, r,
-                                summarize=False,
-                                report_unexpected_exceptions=True,
-                                context=None):
-        """Apply value predicates on the given record `r`."""
-
-        for field_name, predicate, code, message, modulus in self._value_predicates:
-            if i % modulus == 0: # support sampling
-                fi = self._field_names.index(field_name)
-                if fi < len(r): # only apply predicate if there is a value
-                    value = r[fi]
+        report = report_unexpected_exceptions
+        length = len(self._field_names)
+        header = ignore_lines if expect_header_row else -1
+        for i, r in rows:
+            if i == header:
+                if tuple(r) != self._field_names:
+                    for code, message in plan.header_checks:
+                        count(code, None, None)
+                continue
+            if i < ignore_lines:
+                continue
+            skip = False
+            for f in plan.skips:
+                try:
+                    if f(r) is True:
+                        skip = True
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+            if skip:
+                continue
+            rdict = _RecordView(plan.field_index, plan.field_keys, r)
+            for f in plan.each_methods:
+                rdict.reset()
+                try:
+                    f(rdict)
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+            n = len(r)
+            failed = set()
+            for fi, field_name, f, code, message in plan.value_checks.select(i):
+                if fi < n:
                     try:
-                        valid = predicate(value)
-                        if not valid:
-                            p = {'code': code}
-                            if not summarize:
-                                p['message'] = message
-                                p['row'] = i + 1
-                                p['column'] = fi + 1
-                                p['field'] = field_name
-                                p['value'] = value
-                                p['record'] = r
-                                if context is not None: p['context'] = context
-                            yield p
-                    except Exception as e:
-                        if report_unexpected_exceptions:
-                            p = {'code': UNEXPECTED_EXCEPTION}
-                            if not summarize:
-                                p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                                p['row'] = i + 1
-                                p['column'] = fi + 1
-                                p['field'] = field_name
-                                p['value'] = value
-                                p['record'] = r
-                                p['exception'] = e
-                                p['function'] = '%s: %s' % (predicate.__name__,
-                                                            predicate.__doc__)
-                                if context is not None: p['context'] = context
-                            yield p
-
-
-    def _apply_record_checks(self, i, r,
-                                 summarize=False,
-                                 report_unexpected_exceptions=True,
-                                 context=None):
-        """Apply record checks on `r`."""
-
-        for check, modulus in self._record_checks:
-            if i % modulus == 0: # support sampling
-                rdict = self._as_dict(r)
+                        f(r[fi])
+                    except ValueError:
+                        count(code, field_name, f)
+                        failed.add(fi)
+                    except Exception:
+                        if report: count(UNEXPECTED_EXCEPTION, field_name, f)
+                        failed.add(fi)
+            if n != length:
+                for code, message in plan.record_length_checks.select(i):
+                    count(code, None, None)
+            for fi, field_name, f, code, message in plan.value_predicates.select(i):
+                if fi < n:
+                    try:
+                        if not f(r[fi]):
+                            count(code, field_name, f)
+                            failed.add(fi)
+                    except Exception:
+                        if report: count(UNEXPECTED_EXCEPTION, field_name, f)
+                        failed.add(fi)
+            record_checks = plan.record_checks.select(i)
+            record_predicates = plan.record_predicates.select(i)
+            check_methods = plan.check_methods
+            assert_methods = plan.assert_methods
+            if failed and plan.dependencies:
+                record_checks = plan.unaffected(record_checks, failed)
+                record_predicates = plan.unaffected(record_predicates, failed)
+                check_methods = plan.unaffected(check_methods, failed)
+                assert_methods = plan.unaffected(assert_methods, failed)
+            for f in record_checks:
+                rdict.reset()
                 try:
-                    check(rdict)
+                    f(rdict)
                 except RecordError as e:
                     code = e.code if e.code is not None else RECORD_CHECK_FAILED
-                    p = {'code': code}
-                    if not summarize:
-                        message = e.message if e.message is not None else MESSAGES[RECORD_CHECK_FAILED]
-                        p['message'] = message
-                        p['row'] = i + 1
-                        p['record'] = r
-                        if context is not None: p['context'] = context
-                        if e.details is not None: p['details'] = e.details
-                    yield p
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['row'] = i + 1
-                            p['record'] = r
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (check.__name__,
-                                                        check.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
-
-
-    def _apply_record_predicates(self, i, r,
+                    count(code, None, f)
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+            for f, code, message in record_predicates:
+                rdict.reset()
+                try:
+                    if not f(rdict):
+                        count(code, None, f)
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+            for (key, compound, fi, code, message), values in zip(plan.unique_checks,
+                                                                  unique_sets):
+                value = _unique_key(r, compound, fi)
+                if value is not _NO_KEY and values.seen(value, i, r):
+                    count(code, None, tuple(key) if compound else key)
+            for f in check_methods:
+                rdict.reset()
+                try:
+                    f(rdict)
+                except RecordError as e:
+                    code = e.code if e.code is not None else RECORD_CHECK_FAILED
+                    count(code, None, f)
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+            for f in assert_methods:
+                rdict.reset()
+                try:
+                    f(rdict)
+                except AssertionError as e:
+                    count(_assertion_problem(e)[0], None, f)
+                except Exception:
+                    if report: count(UNEXPECTED_EXCEPTION, None, f)
+
+
+    def validate_columns(self, data,
+                         batch_size=10000,
+                         expect_header_row=True,
+                         ignore_lines=0,
+                         summarize=False,
+                         limit=0,
+                         context=None,
+                         report_unexpected_exceptions=True,
+                         fail_fast=False,
+                         stop_on_codes=None,
+                         record_policy='reference'):
+        """
+        Validate `data` in batches of rows, applying value checks and value
+        predicates a column at a time, and return a list of validation problems
+        found.
+
+        See `ivalidate_batches` for the `batch_size` argument, `ivalidate` for
+        the `record_policy` argument, and `validate` for all other arguments.
+
+        """
+
+        problem_generator = self.ivalidate_batches(data, batch_size,
+                                                   expect_header_row,
+                                                   ignore_lines, summarize,
+                                                   context,
+                                                   report_unexpected_exceptions,
+                                                   record_policy)
+        return _collect_problems(problem_generator, 1 if fail_fast else limit,
+                                 stop_on_codes)
+
+
+    def ivalidate_batches(self, data,
+                          batch_size=10000,
+                          expect_header_row=True,
+                          ignore_lines=0,
+                          summarize=False,
+                          context=None,
+                          report_unexpected_exceptions=True,
+                          record_policy='reference'):
+        """
+        Validate `data` in batches of rows, applying value checks and value
+        predicates a column at a time, and return an iterator over problems
+        found.
+
+        The problems found are the same, and are reported in the same order, as
+        for `ivalidate`. However, rather than calling each value check function
+        and value predicate once per row, the values of each field in a batch
+        are gathered into a column, and any check function with a `batch`
+        attribute is given the whole column, which is a NumPy array if NumPy is
+        installed. The `batch` function returns the positions of the values that
+        may not be valid, and only these values are checked one at a time to
+        report problems. The check functions returned by `enumeration`,
+        `match_pattern`, `search_pattern`, `number_range_inclusive`,
+        `number_range_exclusive`, `datetime_string`, `datetime_range_inclusive`
+        and `datetime_range_exclusive` all have a `batch` attribute, which
+        compares numbers all at once if NumPy is installed. Check functions
+        without a `batch` attribute are applied to each value of the column in a
+        tight loop. Value checks and value predicates are assumed to have no
+        side effects, as they are applied to invalid values twice, and may be
+        applied to rows that are later skipped.
+
+        If the only other checks are header checks and record length checks,
+        the rows of each batch are not otherwise validated one at a time, which
+        makes this much faster than `ivalidate` for such checks. Any other
+        checks are applied one row at a time, as for `ivalidate`, so validation
+        with record checks, unique checks, skips or 'each', 'check' or 'assert'
+        methods takes about as long as with `ivalidate`.
+
+        Arguments
+        ---------
+
+        `batch_size` - the number of rows to validate at a time
+
+        See `ivalidate` for all other arguments.
+
+        """
+
+        assert batch_size > 0, 'batch size must be positive'
+        plan = self._sync_plan()
+        unique_sets = self._init_unique_sets(plan, data) # used for unique checks
+        policy = _RecordPolicy(record_policy, data)
+        rows = policy.read()
+        # if only value checks, value predicates, header checks and record
+        # length checks are applied, rows need not be validated one at a time
+        values_only = not (plan.skips or plan.each_methods or
+                           plan.record_checks.items or
+                           plan.record_predicates.items or
+                           plan.unique_checks or plan.check_methods or
+                           plan.assert_methods)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            header = ignore_lines if expect_header_row else -1
+            data_rows = [(i, r) for i, r in batch
+                         if i >= ignore_lines and i != header]
+            failed = dict() if plan.dependencies else None
+            columnar = (self._apply_columnar(plan.value_checks, data_rows,
+                                             self._apply_value_checks, False,
+                                             summarize,
+                                             report_unexpected_exceptions,
+                                             context, failed),
+                        self._apply_columnar(plan.value_predicates, data_rows,
+                                             self._apply_value_predicates, True,
+                                             summarize,
+                                             report_unexpected_exceptions,
+                                             context, failed),
+                        failed)
+            if values_only:
+                problem_generator = self._ivalidate_values(
+                        plan, policy.rows(batch), expect_header_row,
+                        ignore_lines, summarize, context, columnar)
+            else:
+                problem_generator = self._ivalidate_rows(
+                        plan, policy.rows(batch), unique_sets,
+                        expect_header_row, ignore_lines, summarize,
+                        report_unexpected_exceptions, context, columnar)
+            for p in policy.apply(problem_generator):
+                yield p
+        for p in self._finish_unique_checks(plan, unique_sets, data, summarize,
+                                            context):
+            yield p
+        for p in self._apply_finally_assert_methods(plan.finally_assert_methods,
+                                                    summarize,
+                                                    report_unexpected_exceptions,
+                                                    context):
+            yield p
+
+
+    def _ivalidate_values(self, plan, rows, expect_header_row, ignore_lines,
+                          summarize, context, columnar):
+        """
+        Report the problems found on `rows` as `_ivalidate_rows` would, for a
+        plan with only value checks, value predicates, header checks and record
+        length checks, where `columnar` is as for `_ivalidate_rows`.
+
+        """
+
+        checks, predicates = columnar[0], columnar[1]
+        n = len(self._field_names)
+        for i, r in rows:
+            if expect_header_row and i == ignore_lines:
+                # r is the header row
+                for p in self._apply_header_checks(i, r, plan.header_checks,
+                                                   summarize, context):
+                    yield p
+            elif i >= ignore_lines:
+                # r is a data row
+                if i in checks:
+                    for p in checks[i]:
+                        yield p
+                if len(r) != n:
+                    for p in self._apply_record_length_checks(
+                            i, r, plan.record_length_checks.select(i),
+                            summarize, context):
+                        yield p
+                if i in predicates:
+                    for p in predicates[i]:
+                        yield p
+
+
+    def _apply_columnar(self, stage, rows, apply, predicates,
+                        summarize=False,
+                        report_unexpected_exceptions=True,
+                        context=None,
+                        failed=None):
+        """
+        Apply the compiled value checks or value predicates in `stage` a column
+        at a time on `rows`, a list of (index, record) pairs, and return a
+        dictionary mapping row index to the problems found in that row.
+
+        If `failed` is given, it is a dictionary updated to map row index to the
+        column indices of the values which failed in that row.
+
+        """
+
+        problems = dict()
+        columns = dict() # cache columns by field index and modulus
+        selections = {1: rows} # cache the rows selected by modulus
+        for item, modulus in zip(stage.items, stage.item_moduli):
+            fi, f = item[0], item[2]
+            column = columns.get((fi, modulus))
+            if column is None:
+                selected = selections.get(modulus)
+                if selected is None:
+                    selected = [(i, r) for i, r in rows if i % modulus == 0]
+                    selections[modulus] = selected
+                column = _Column(fi, selected)
+                columns[(fi, modulus)] = column
+            candidates = None
+            batch = getattr(f, 'batch', None)
+            if batch is not None:
+                try:
+                    candidates = batch(column.array())
+                except Exception:
+                    pass # fall back to applying f to each value
+            if candidates is None:
+                candidates = list()
+                for j, v in enumerate(column.values):
+                    try:
+                        valid = f(v)
+                        if predicates and not valid:
+                            candidates.append(j)
+                    except Exception:
+                        candidates.append(j)
+            # report problems for candidates in the usual way
+            for j in candidates:
+                i, r = column.rows[j]
+                row_failed = None
+                if failed is not None:
+                    row_failed = failed.setdefault(i, set())
+                for p in apply(i, r, (item,), summarize,
+                               report_unexpected_exceptions, context,
+                               row_failed):
+                    problems.setdefault(i, []).append(p)
+        # problems are found check by check, but reported row by row
+        return problems
+
+
+    def validate_file(self, path,
+                      dialect='excel',
+                      expect_header_row=True,
+                      ignore_lines=0,
+                      summarize=False,
+                      limit=0,
+                      context=None,
+                      report_unexpected_exceptions=True,
+                      encoding='utf-8',
+                      executor=None,
+                      window=1000,
+                      fail_fast=False,
+                      stop_on_codes=None,
+                      record_policy='reference',
+                      adaptive=0,
+                      profile=False,
+                      **fmtparams):
+        """
+        Validate the CSV file at `path` and return a list of validation problems
+        found.
+
+        The file is read in large blocks, and records are read from it as by
+        `csv.reader`, except that lines which don't contain quotes are simply
+        split on the delimiter, if the dialect allows. Problems found in a
+        record have the byte 'offset' at which the record starts in the file, as
+        well as the 'row'.
+
+        Arguments
+        ---------
+
+        `path` - path to the CSV file to validate
+
+        `dialect` - the CSV dialect, as for `csv.reader`, further formatting
+        parameters may be given as keyword arguments
+
+        `encoding` - the character encoding of the file, used on Python 3 only
+
+        See `ivalidate` for the `executor`, `window`, `record_policy`, which may
+        be 'offset', `adaptive` and `profile` arguments, and `validate` for all
+        other arguments.
+
+        """
+
+        reader = _RecordReader(path, dialect=dialect, encoding=encoding,
+                               buffer_size=_FILE_BUFFER_SIZE,
+                               report_offsets=True, **fmtparams)
+        problem_generator = self.ivalidate(reader, expect_header_row,
+                                           ignore_lines, summarize, context,
+                                           report_unexpected_exceptions,
+                                           executor, window, record_policy,
+                                           adaptive, profile)
+        return _collect_problems(problem_generator, 1 if fail_fast else limit,
+                                 stop_on_codes)
+
+
+    def validate_parallel(self, path,
+                          workers=None,
+                          dialect='excel',
+                          shards=None,
+                          expect_header_row=True,
+                          ignore_lines=0,
+                          summarize=False,
+                          limit=0,
+                          context=None,
+                          report_unexpected_exceptions=True,
+                          encoding='utf-8',
+                          fail_fast=False,
+                          stop_on_codes=None,
+                          record_policy='reference',
+                          **fmtparams):
+        """
+        Validate the CSV file at `path` using multiple processes, and return a
+        list of validation problems found.
+
+        The file is split into shards of roughly equal size on line boundaries,
+        which are validated in parallel by a pool of worker processes, each of
+        which validates a shard using a copy of this validator. Problems are
+        reported in order of row, with row numbers counted from the start of
+        the file. All checks are applied as for `validate`, with the following
+        differences:
+
+        * Unique checks are applied in this process, to the keys found by the
+          workers, so that duplicates in different shards are found. Within a
+          row, problems found by unique checks are reported after all other
+          problems found in that row.
+
+        * Any state accumulated by 'each' methods is accumulated separately for
+          each shard. After validating a shard, the worker calls
+          `get_shard_state`, and the returned state is passed to
+          `merge_shard_state` on this validator, shard by shard in order, once
+          all shards have been validated. The 'finally_assert' methods are then
+          applied by this validator.
+
+        Records are counted in each shard before they are validated, and if any
+        record continues into the next shard, e.g., because of a line break in a
+        quoted value, the whole file is validated in this process instead. On
+        platforms where worker processes are not forked, the validator must
+        also be picklable.
+
+        Arguments
+        ---------
+
+        `path` - path to the CSV file to validate
+
+        `workers` - number of worker processes, defaults to the number of CPUs
+
+        `dialect` - the CSV dialect, as for `csv.reader`, further formatting
+        parameters may be given as keyword arguments
+
+        `shards` - number of shards to split the file into, defaults to four
+        times the number of workers
+
+        `encoding` - the character encoding of the file, used on Python 3 only
+
+        See `ivalidate` for the `record_policy` argument, which may be
+        'offset', and `validate` for all other arguments.
+
+        """
+
+        problem_generator = self._ivalidate_parallel(path, workers, dialect,
+                                                     shards, expect_header_row,
+                                                     ignore_lines, summarize,
+                                                     context,
+                                                     report_unexpected_exceptions,
+                                                     encoding, record_policy,
+                                                     fmtparams)
+        # closing the generator terminates the worker processes
+        return _collect_problems(problem_generator, 1 if fail_fast else limit,
+                                 stop_on_codes)
+
+
+    def get_shard_state(self):
+        """
+        Return any state accumulated by 'each' methods while validating a shard
+        in a worker process, see `validate_parallel`. The state must be
+        picklable. By default returns None, override this method in sub-classes
+        that define 'finally_assert' methods.
+
+        """
+
+        return None
+
+
+    def merge_shard_state(self, state):
+        """
+        Merge the `state` returned by `get_shard_state` for a shard into this
+        validator, see `validate_parallel`. By default does nothing, override
+        this method in sub-classes that define 'finally_assert' methods.
+
+        """
+
+        pass
+
+
+    def _ivalidate_parallel(self, path, workers, dialect, shards,
+                            expect_header_row, ignore_lines, summarize, context,
+                            report_unexpected_exceptions, encoding,
+                            record_policy, fmtparams):
+        """Implement `validate_parallel`, returning an iterator over problems."""
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if shards is None:
+            shards = 4 * workers
+        size = os.path.getsize(path)
+        bounds = sorted(set(size * k // shards for k in range(shards + 1)))
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        plan = self._sync_plan()
+        options = (dialect, encoding, fmtparams, expect_header_row,
+                   ignore_lines, summarize, report_unexpected_exceptions,
+                   context, record_policy)
+        source = _RecordReader(path, dialect=dialect, encoding=encoding,
+                               **fmtparams)
+        # used for unique checks, candidate duplicates are confirmed by reading
+        # records from source at the offsets found by the shards
+        unique_sets = self._init_unique_sets(plan, source)
+        policy = _RecordPolicy(record_policy, source)
+        # each shard is validated by a fresh copy of this validator
+        pool = multiprocessing.Pool(workers, _init_shard_worker,
+                                    (self, path, options),
+                                    maxtasksperchild=1)
+        source.open()
+        try:
+            # count rows in each shard, to number rows from the start of the file
+            counts = pool.map(_count_shard, ranges)
+            if any(continued for n, continued in counts):
+                # a record continues into the next shard, e.g., because of a
+                # line break in a quoted value, so validate the whole file in
+                # this process instead
+                pool.terminate()
+                for p in self.ivalidate(source, expect_header_row,
+                                        ignore_lines, summarize, context,
+                                        report_unexpected_exceptions,
+                                        record_policy=record_policy):
+                    yield p
+                return
+            tasks = list()
+            first = 0
+            for (start, end), (n, continued) in zip(ranges, counts):
+                tasks.append((start, end, first))
+                first += n
+            states = list()
+            # records are only read again for problems which keep them
+            read = not summarize and record_policy in ('reference', 'copy')
+            for found, keys, state in pool.imap(_validate_shard, tasks):
+                # apply unique checks to the keys found in the shard
+                duplicates = list()
+                for check, values, shard_keys in zip(plan.unique_checks,
+                                                     unique_sets, keys):
+                    for value, i, offset in shard_keys:
+                        source.offset = offset
+                        if values.seen(value, i, None):
+                            duplicates.append((check, value, i, offset))
+                records = dict()
+                if read and duplicates:
+                    records = _read_records(path, [t[3] for t in duplicates],
+                                            dialect, encoding, fmtparams)
+                for (key, compound, fi, code, message), value, i, offset \
+                        in duplicates:
+                    p = Problem(code)
+                    if not summarize:
+                        p.message = message
+                        p.row = i + 1
+                        p.record = records.get(offset)
+                        p.key = key
+                        p.value = value
+                        if context is not None: p.context = context
+                    found.append((i, 1, policy.retain(p, offset)))
+                found.sort(key=lambda t: t[:2]) # stable, by row then kind
+                for i, kind, p in found:
+                    yield p
+                states.append(state)
+        finally:
+            pool.terminate()
+            source.close()
+        for p in self._finish_unique_checks(plan, unique_sets, None, summarize,
+                                            context):
+            yield p
+        # workers are forked from this process as needed, so this validator
+        # must not be modified while there are shards left to validate
+        for state in states:
+            self.merge_shard_state(state)
+        for p in self._apply_finally_assert_methods(plan.finally_assert_methods,
+                                                    summarize,
+                                                    report_unexpected_exceptions,
+                                                    context):
+            yield p
+
+
+    def _validate_shard(self, path, start, end, first, dialect, encoding,
+                        fmtparams, expect_header_row, ignore_lines, summarize,
+                        report_unexpected_exceptions, context, record_policy):
+        """
+        Validate the shard of the file at `path` starting at byte offset
+        `start` and ending at byte offset `end`, where the first row of the
+        shard has index `first`, applying all checks except unique checks and
+        'finally_assert' methods. Return a list of (index, 0, problem) tuples, a
+        list of the keys found in the shard for each unique check, and the
+        shard state.
+
+        """
+
+        plan = self.compile()
+        reader = _RecordReader(path, start, end, dialect, encoding, **fmtparams)
+        # collect keys rather than checking them
+        collectors = [_KeyCollector(reader) for t in plan.unique_checks]
+        policy = _RecordPolicy(record_policy, reader)
+        current = [None] # index of the row being validated
+        def rows():
+            for i, r in policy.rows(policy.read(first)):
+                current[0] = i
+                yield i, r
+        found = list()
+        problem_generator = self._ivalidate_rows(plan, rows(), collectors,
+                                                 expect_header_row,
+                                                 ignore_lines, summarize,
+                                                 report_unexpected_exceptions,
+                                                 context)
+        for p in policy.apply(problem_generator):
+            found.append((current[0], 0, p))
+        keys = [c.keys for c in collectors]
+        return found, keys, self.get_shard_state()
+
+
+    def _init_unique_sets(self, plan, data=None):
+        """
+        Initialise the sets of keys used for uniqueness checking, where `data`
+        is the data being validated, if records can be found again by index, or
+        by offset, e.g., a `_RecordReader`.
+
+        """
+
+        find = locate = None
+        if hasattr(data, '__getitem__'):
+            find = data.__getitem__
+        elif hasattr(data, 'read_record'):
+            # records are found again by the offset of the current record when
+            # a key is first seen
+            find = data.read_record
+            locate = lambda i: data.offset
+        unique_sets = list()
+        for (key, compound, fi, code, message), options in zip(plan.unique_checks,
+                                                               plan.unique_options):
+            if options['max_keys'] is not None:
+                values = _SpillingKeys(options['max_keys'], options['tempdir'])
+            elif options['fingerprint'] is None:
+                values = _UniqueKeys()
+            else:
+                confirm = None
+                if options['confirm'] and find is not None:
+                    def confirm(value, j, compound=compound, fi=fi):
+                        return _unique_key(find(j), compound, fi) == value
+                values = _FingerprintKeys(options['fingerprint'], confirm,
+                                          locate)
+            if options['bloom'] is not None:
+                values = _BloomKeys(values, options['bloom'])
+            unique_sets.append(values)
+        return unique_sets
+
+
+    def _finish_unique_checks(self, plan, unique_sets, data=None,
+                              summarize=False,
+                              context=None):
+        """
+        Report any duplicate keys found by the unique checks in `plan` once all
+        records have been validated, including records from `data` if they can
+        be found again by index.
+
+        """
+
+        if not hasattr(data, '__getitem__'):
+            data = None
+        for (key, compound, fi, code, message), values in zip(plan.unique_checks,
+                                                              unique_sets):
+            for value, i in values.finish():
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    p.row = i + 1
+                    if data is not None: p.record = data[i]
+                    p.key = key
+                    p.value = value
+                    if context is not None: p.context = context
+                yield p
+
+
+    def _apply_value_checks(self, i, r, checks,
+                            summarize=False,
+                            report_unexpected_exceptions=True,
+                            context=None,
+                            failed=None):
+        """
+        Apply the compiled value `checks` on the given record `r`, adding the
+        column index of any value which fails to `failed`, if given.
+
+        """
+
+        n = len(r)
+        for fi, field_name, check, code, message in checks:
+            if fi < n: # only apply checks if there is a value
+                value = r[fi]
+                try:
+                    check(value)
+                except ValueError:
+                    if failed is not None: failed.add(fi)
+                    p = Problem(code)
+                    if not summarize:
+                        p.message = message
+                        p.row = i + 1
+                        p.column = fi + 1
+                        p.field = field_name
+                        p.value = value
+                        p.record = r
+                        if context is not None: p.context = context
+                    yield p
+                except Exception as e:
+                    if failed is not None: failed.add(fi)
+                    if report_unexpected_exceptions:
+                        p = Problem(UNEXPECTED_EXCEPTION)
+                        if not summarize:
+                            p.row = i + 1
+                            p.column = fi + 1
+                            p.field = field_name
+                            p.value = value
+                            p.record = r
+                            p.exception = e
+                            p.function = check
+                            if context is not None: p.context = context
+                        yield p
+
+
+    def _apply_header_checks(self, i, r, checks, summarize=False, context=None):
+        """Apply the compiled header `checks` on the given record `r`."""
+
+        for code, message in checks:
+            if tuple(r) != self._field_names:
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    p.row = i + 1
+                    p.record = tuple(r)
+                    p.missing = set(self._field_names) - set(r)
+                    p.unexpected = set(r) - set(self._field_names)
+                    if context is not None: p.context = context
+                yield p
+
+
+    def _apply_record_length_checks(self, i, r, checks, summarize=False,
+                                    context=None):
+        """Apply the compiled record length `checks` on the given record `r`."""
+
+        for code, message in checks:
+            if len(r) != len(self._field_names):
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    p.row = i + 1
+                    p.record = r
+                    p.length = len(r)
+                    if context is not None: p.context = context
+                yield p
+
+
+    def _apply_value_predicates(self, i, r, predicates,
+                                summarize=False,
+                                report_unexpected_exceptions=True,
+                                context=None,
+                                failed=None):
+        """
+        Apply the compiled value `predicates` on the given record `r`, adding
+        the column index of any value which fails to `failed`, if given.
+
+        """
+
+        n = len(r)
+        for fi, field_name, predicate, code, message in predicates:
+            if fi < n: # only apply predicate if there is a value
+                value = r[fi]
+                try:
+                    valid = predicate(value)
+                    if not valid:
+                        if failed is not None: failed.add(fi)
+                        p = Problem(code)
+                        if not summarize:
+                            p.message = message
+                            p.row = i + 1
+                            p.column = fi + 1
+                            p.field = field_name
+                            p.value = value
+                            p.record = r
+                            if context is not None: p.context = context
+                        yield p
+                except Exception as e:
+                    if failed is not None: failed.add(fi)
+                    if report_unexpected_exceptions:
+                        p = Problem(UNEXPECTED_EXCEPTION)
+                        if not summarize:
+                            p.row = i + 1
+                            p.column = fi + 1
+                            p.field = field_name
+                            p.value = value
+                            p.record = r
+                            p.exception = e
+                            p.function = predicate
+                            if context is not None: p.context = context
+                        yield p
+
+
+    def _apply_record_checks(self, i, r, rdict, checks,
+                             summarize=False,
+                             report_unexpected_exceptions=True,
+                             context=None):
+        """Apply the compiled record `checks` on `r`, viewed as `rdict`."""
+
+        for check in checks:
+            rdict.reset() # discard any changes made by previous functions
+            try:
+                check(rdict)
+            except RecordError as e:
+                code = e.code if e.code is not None else RECORD_CHECK_FAILED
+                p = Problem(code)
+                if not summarize:
+                    message = e.message if e.message is not None else MESSAGES[RECORD_CHECK_FAILED]
+                    p.message = message
+                    p.row = i + 1
+                    p.record = r
+                    if context is not None: p.context = context
+                    if e.details is not None: p.details = e.details
+                yield p
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = check
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_record_predicates(self, i, r, rdict, predicates,
                                  summarize=False,
                                  report_unexpected_exceptions=True,
                                  context=None):
-        """Apply record predicates on `r`."""
+        """Apply the compiled record `predicates` on `r`, viewed as `rdict`."""
+
+        for predicate, code, message in predicates:
+            rdict.reset() # discard any changes made by previous functions
+            try:
+                valid = predicate(rdict)
+                if not valid:
+                    p = Problem(code)
+                    if not summarize:
+                        p.message = message
+                        p.row = i + 1
+                        p.record = r
+                        if context is not None: p.context = context
+                    yield p
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = predicate
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_unique_checks(self, i, r, checks, unique_sets,
+                             summarize=False,
+                             context=None):
+        """
+        Apply the compiled unique `checks` on `r`, using the corresponding sets
+        of keys in `unique_sets`.
+
+        """
+
+        for (key, compound, fi, code, message), values in zip(checks,
+                                                              unique_sets):
+            value = _unique_key(r, compound, fi)
+            if value is _NO_KEY:
+                continue
+            if values.seen(value, i, r):
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    p.row = i + 1
+                    p.record = r
+                    p.key = key
+                    p.value = value
+                    if context is not None: p.context = context
+                yield p
+
+
+    def _apply_each_methods(self, i, r, rdict, methods,
+                            summarize=False,
+                            report_unexpected_exceptions=True,
+                            context=None):
+        """Invoke the discovered 'each' `methods` on `r`, viewed as `rdict`."""
+
+        for f in methods:
+            rdict.reset() # discard any changes made by previous functions
+            try:
+                f(rdict)
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = f
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_assert_methods(self, i, r, rdict, methods,
+                              summarize=False,
+                              report_unexpected_exceptions=True,
+                              context=None):
+        """Apply the discovered 'assert' `methods` on `r`, viewed as `rdict`."""
+
+        for f in methods:
+            rdict.reset() # discard any changes made by previous functions
+            try:
+                f(rdict)
+            except AssertionError as e:
+                code, message = _assertion_problem(e)
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    p.row = i + 1
+                    p.record = r
+                    if context is not None: p.context = context
+                yield p
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = f
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_check_methods(self, i, r, rdict, methods,
+                              summarize=False,
+                              report_unexpected_exceptions=True,
+                              context=None):
+        """Apply the discovered 'check' `methods` on `r`, viewed as `rdict`."""
+
+        for f in methods:
+            rdict.reset() # discard any changes made by previous functions
+            try:
+                f(rdict)
+            except RecordError as e:
+                code = e.code if e.code is not None else RECORD_CHECK_FAILED
+                p = Problem(code)
+                if not summarize:
+                    message = e.message if e.message is not None else MESSAGES[RECORD_CHECK_FAILED]
+                    p.message = message
+                    p.row = i + 1
+                    p.record = r
+                    if context is not None: p.context = context
+                    if e.details is not None: p.details = e.details
+                yield p
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = f
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_finally_assert_methods(self, methods,
+                                      summarize=False,
+                                      report_unexpected_exceptions=True,
+                                      context=None):
+        """Apply the discovered 'finally_assert' `methods`."""
+
+        for f in methods:
+            try:
+                f()
+            except AssertionError as e:
+                code, message = _assertion_problem(e)
+                p = Problem(code)
+                if not summarize:
+                    p.message = message
+                    if context is not None: p.context = context
+                yield p
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.exception = e
+                        p.function = f
+                        if context is not None: p.context = context
+                    yield p
+
+
+    def _apply_skips(self, i, r, skips,
+                     summarize=False,
+                     report_unexpected_exceptions=True,
+                     context=None):
+        """Apply the compiled `skips` on `r`."""
+
+        for skip in skips:
+            try:
+                result = skip(r)
+                if result is True:
+                    yield True
+            except Exception as e:
+                if report_unexpected_exceptions:
+                    p = Problem(UNEXPECTED_EXCEPTION)
+                    if not summarize:
+                        p.row = i + 1
+                        p.record = r
+                        p.exception = e
+                        p.function = skip
+                        if context is not None: p.context = context
+                    yield p
+
+
+class _UniqueKeys(object):
+    """The set of keys seen so far by a unique check."""
+
+    __slots__ = ('_values',)
+
+
+    def __init__(self):
+        self._values = set()
+
+
+    def seen(self, value, i, r):
+        """
+        Return True if the key `value`, found in record `r` at index `i`, has
+        been seen before, otherwise add it to the set and return False.
+
+        """
+
+        values = self._values
+        if value in values:
+            return True
+        values.add(value)
+        return False
+
+
+    def add(self, value, i):
+        """Add the key `value`, found at index `i`, known not to be seen."""
+
+        self._values.add(value)
+
+
+    def finish(self):
+        """
+        Return an iterable of any duplicate keys not yet reported, with the
+        index of the record each was found in, once all records have been seen.
+
+        """
+
+        return ()
+
+
+class _FingerprintKeys(object):
+    """
+    The fingerprints of the keys seen so far by a unique check, in an open
+    addressing hash table, see `CSVValidator.add_unique_check`.
+
+    If given, `confirm(value, j)` returns True if the key in the record at index
+    `j` is `value`, and is used to confirm candidate duplicates. If `locate` is
+    also given, `locate(i)` returns where to find the record at index `i` again
+    instead, e.g., its byte offset, which is then passed to `confirm` as `j`.
+
+    """
+
+    __slots__ = ('_width', '_table', '_empty', '_mask', '_size', '_first',
+                 '_confirm', '_locate', '_collisions')
+
+
+    def __init__(self, bits=64, confirm=None, locate=None, capacity=1024):
+        self._width = bits // 32 # fingerprints are stored as 32 bit words
+        self._table = array('I', [0]) * (capacity * self._width)
+        self._empty = array('I', [0]) * self._width
+        self._mask = capacity - 1 # capacity must be a power of 2
+        self._size = 0
+        self._confirm = confirm
+        self._locate = locate
+        # index, or location, of the record each fingerprint was first found
+        # in, as doubles if located, as offsets may not fit in a C long on some
+        # platforms, and doubles are exact up to 2**53
+        self._first = None
+        if confirm is not None:
+            self._first = array('d' if locate else 'l', [0]) * capacity
+        # keys found with the same fingerprint as a different key
+        self._collisions = set()
+
+
+    def seen(self, value, i, r):
+        """
+        Return True if the key `value`, found in record `r` at index `i`, has
+        been seen before, otherwise add it to the table and return False.
+
+        """
+
+        fingerprint = _fingerprint(value, self._width)
+        table, w, mask = self._table, self._width, self._mask
+        s = fingerprint[0] & mask
+        while True:
+            found = table[s * w:(s + 1) * w]
+            if found == fingerprint:
+                break
+            if found == self._empty:
+                table[s * w:(s + 1) * w] = fingerprint
+                first, locate = self._first, self._locate
+                if first is not None:
+                    first[s] = i if locate is None else locate(i)
+                self._size += 1
+                if 2 * self._size > mask:
+                    self._resize()
+                return False
+            s = (s + 1) & mask # linear probing
+        if self._confirm is None or value in self._collisions:
+            return True
+        if self._confirm(value, int(self._first[s])):
+            return True
+        self._collisions.add(value)
+        return False
+
+
+    def add(self, value, i):
+        # another key may have the same fingerprint, so look it up anyway
+        self.seen(value, i, None)
+
+
+    def finish(self):
+        return ()
+
+
+    def _resize(self):
+        """Double the capacity of the table, to keep it at most half full."""
+
+        table, first, w = self._table, self._first, self._width
+        capacity = 2 * (self._mask + 1)
+        self._table = array('I', [0]) * (capacity * w)
+        self._mask = mask = capacity - 1
+        if first is not None:
+            self._first = array(first.typecode, [0]) * capacity
+        for k in range(len(table) // w):
+            fingerprint = table[k * w:(k + 1) * w]
+            if fingerprint != self._empty:
+                s = fingerprint[0] & mask
+                while self._table[s * w:(s + 1) * w] != self._empty:
+                    s = (s + 1) & mask
+                self._table[s * w:(s + 1) * w] = fingerprint
+                if first is not None:
+                    self._first[s] = first[k]
+
+
+def _function_name(f):
+    return getattr(f, '__name__', type(f).__name__)
+
+
+def _registered(f):
+    """
+    Return the function added to a validator which `f` stands in for in a
+    validation plan, e.g., to memoize it, or `f` itself.
+
+    """
+
+    return getattr(f, '_registered', f)
+
+
+class _Memoized(object):
+    """
+    Stands in for a value check or value predicate `function`, remembering what
+    it returned or raised for the `cache_size` most recently used values.
+
+    """
+
+    def __init__(self, function, cache_size=1024):
+        iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+        assert iscoroutinefunction is None or not iscoroutinefunction(function), \
+            'coroutine functions cannot be memoized'
+        assert cache_size > 0, 'cache size must be positive'
+        self.function = function
+        self._registered = function # see _registered
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # maps value to (returned, result)
+        self.hits = 0
+        self.misses = 0
+        batch = getattr(function, 'batch', None)
+        if batch is not None:
+            self.batch = batch # used by ivalidate_batches
+        # used to report unexpected exceptions
+        self.__name__ = getattr(function, '__name__', type(function).__name__)
+        self.__doc__ = function.__doc__
+
+
+    def __call__(self, value):
+        cache = self.cache
+        try:
+            outcome = cache.pop(value)
+        except KeyError:
+            self.misses += 1
+            try:
+                outcome = True, self.function(value)
+            except Exception as e:
+                outcome = False, e
+            if len(cache) >= self.cache_size:
+                cache.popitem(last=False) # least recently used
+        except TypeError: # value is not hashable
+            return self.function(value)
+        else:
+            self.hits += 1
+        cache[value] = outcome
+        returned, result = outcome
+        if returned:
+            return result
+        if not _PY2:
+            # don't accumulate tracebacks on the same exception
+            result.__traceback__ = None
+        raise result
+
+
+class _MeasuredKeys(object):
+    """
+    Stands in for the `keys` kept by a unique check, recording `stats` on the
+    calls made to find duplicates.
+
+    """
+
+    def __init__(self, keys, stats):
+        self.seen = _Measured(keys.seen, stats, (), bool)
+        self.add = keys.add
+        self.finish = keys.finish
+
+
+def _fingerprint(value, width):
+    """Return the fingerprint of the key `value`, as `width` 32 bit words."""
+
+    data = repr(value)
+    if not _PY2:
+        data = data.encode('utf-8', 'backslashreplace')
+    digest = hashlib.md5(data).digest()[:4 * width]
+    words = array('I')
+    if _PY2:
+        words.fromstring(digest)
+    else:
+        words.frombytes(digest)
+    if not any(words):
+        words[-1] = 1 # all zeros marks an empty slot
+    return words
+
+
+_NO_KEY = object()
+
+
+def _assertion_problem(e):
+    """
+    Return the problem code and message for the assertion error `e`, raised by
+    an 'assert' or 'finally_assert' method.
+
+    """
+
+    code = ASSERT_CHECK_FAILED
+    message = MESSAGES[ASSERT_CHECK_FAILED]
+    if len(e.args) > 0:
+        custom = e.args[0]
+        if isinstance(custom, (list, tuple)):
+            if len(custom) > 0:
+                code = custom[0]
+            if len(custom) > 1:
+                message = custom[1]
+        else:
+            code = custom
+    return code, message
+
+
+def _unique_key(r, compound, fi):
+    """
+    Return the key of a unique check in the record `r`, or `_NO_KEY` if the
+    record is too short for a key.
+
+    """
+
+    n = len(r)
+    if not compound: # key is a field name
+        if fi >= n:
+            return _NO_KEY
+        return r[fi]
+    else: # key is a list or tuple, i.e., compound key
+        value = []
+        for j in fi:
+            if j >= n:
+                break
+            value.append(r[j])
+        return tuple(value) # enable hashing
+
+
+class _SpillingKeys(object):
+    """
+    The keys seen so far by a unique check, of which at most `max_keys` are
+    kept in memory, and the rest in sorted runs in a temporary file in
+    `tempdir`, see `CSVValidator.add_unique_check`.
+
+    """
+
+    __slots__ = ('_max_keys', '_tempdir', '_keys', '_file', '_runs', '_missed')
+
+
+    def __init__(self, max_keys, tempdir=None):
+        self._max_keys = max_keys
+        self._tempdir = tempdir
+        self._keys = dict() # maps keys in memory to the index they were found
+        self._file = None
+        self._runs = list() # start and end offsets of the runs in the file
+        # has a key not in memory been looked up since keys were written?
+        self._missed = False
+
+
+    def seen(self, value, i, r):
+        """
+        Return True if the key `value`, found in record `r` at index `i`, is
+        one of the keys in memory, otherwise add it and return False.
+
+        """
+
+        keys = self._keys
+        if value in keys:
+            return True
+        if self._runs:
+            self._missed = True
+        keys[value] = i
+        if len(keys) >= self._max_keys:
+            self._spill()
+        return False
+
+
+    def add(self, value, i):
+        """Add the key `value`, found at index `i`, known not to be seen."""
+
+        keys = self._keys
+        keys[value] = i
+        if len(keys) >= self._max_keys:
+            self._spill()
+
+
+    def _spill(self):
+        """Append the keys in memory to the temporary file as a sorted run."""
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self._tempdir)
+        f = self._file
+        start = f.tell()
+        for item in sorted(self._keys.items()):
+            pickle.dump(item, f, pickle.HIGHEST_PROTOCOL)
+        self._runs.append((start, f.tell()))
+        self._keys = dict()
+
+
+    def finish(self):
+        if not self._missed:
+            self._close()
+            return () # all duplicates have been reported
+        if self._keys:
+            self._spill()
+        return self._merge()
+
+
+    def _merge(self):
+        """Merge the runs, generating any duplicate keys."""
+
+        try:
+            f, runs = self._file, self._runs
+            # read about as many keys at a time as are kept in memory
+            count = max(1, self._max_keys // len(runs))
+            previous = _NO_KEY
+            for value, i in heapq.merge(*[_load_run(f, start, end, count)
+                                          for start, end in runs]):
+                if value == previous:
+                    yield value, i
+                previous = value
+        finally:
+            self._close()
+
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._runs = list()
+
+
+class _BloomKeys(object):
+    """
+    A Bloom filter in front of `keys`, the keys seen so far by a unique check,
+    which are only looked up for keys that may have been seen before, see
+    `CSVValidator.add_unique_check`.
+
+    """
+
+    __slots__ = ('_keys', '_bits', '_size', '_hashes')
+
+
+    def __init__(self, keys, capacity, error_rate=0.01):
+        self._keys = keys
+        size = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self._size = max(8, int(math.ceil(size))) # in bits
+        self._hashes = max(1, int(round(self._size * math.log(2) / capacity)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+
+    def seen(self, value, i, r):
+        """
+        Return True if the key `value`, found in record `r` at index `i`, has
+        been seen before, otherwise add it and return False.
+
+        """
+
+        # derive the bits for the key from two 64 bit hashes
+        words = _fingerprint(value, 4)
+        h1 = words[0] | words[1] << 32
+        h2 = words[2] | words[3] << 32 | 1
+        bits, size = self._bits, self._size
+        new = False
+        for k in range(self._hashes):
+            b = (h1 + k * h2) % size
+            mask = 1 << (b & 7)
+            if not bits[b >> 3] & mask:
+                bits[b >> 3] |= mask
+                new = True
+        if new:
+            self._keys.add(value, i)
+            return False
+        return self._keys.seen(value, i, r)
+
+
+    def finish(self):
+        return self._keys.finish()
+
+
+def _load_run(f, start, end, count):
+    """
+    Generate the (key, index) pairs written to the file `f` by `_SpillingKeys`
+    between the offsets `start` and `end`, reading `count` at a time, so that
+    many runs in the same file may be read at once.
+
+    """
+
+    position = start
+    while position < end:
+        f.seek(position)
+        items = list()
+        while len(items) < count and f.tell() < end:
+            items.append(pickle.load(f))
+        position = f.tell()
+        for item in items:
+            yield item
+
+
+class _KeyCollector(object):
+    """
+    Collects the keys seen by a unique check in a shard, with the index and
+    byte offset of the record each key was found in, see
+    `CSVValidator.validate_parallel`.
+
+    """
+
+
+    def __init__(self, reader):
+        self.keys = list()
+        self._reader = reader
+
+
+    def seen(self, value, i, r):
+        self.keys.append((value, i, self._reader.offset))
+        return False
+
+
+class _RecordReader(object):
+    """
+    Iterate over the records of the CSV file at `path`, which start at or after
+    byte offset `start` and before byte offset `end`, keeping track of the byte
+    offset at which the current record starts.
+
+    If `start` is not at the start of a line, reading starts from the next line.
+    Records are read as by `csv.reader` with the given `dialect` and formatting
+    parameters, but blocks of `buffer_size` bytes, or failing that lines, which
+    `_line_splitter` can split are split without it. Files are read in binary
+    mode and, on Python 3, decoded using `encoding`. If lines end with carriage
+    returns alone, see `_seek_line`, they are all read by `csv.reader`.
+
+    Records are read again by offset, e.g., to confirm candidate duplicate
+    keys, from the file kept open by `open` while iterating, or else by opening
+    it again.
+
+    If `report_offsets` is true, problems found in the records read are given
+    the 'offset' of the record, whatever the record policy, see
+    `_RecordPolicy`.
+
+    """
+
+
+    def __init__(self, path, start=0, end=None, dialect='excel',
+                 encoding='utf-8', buffer_size=io.DEFAULT_BUFFER_SIZE,
+                 report_offsets=False, **fmtparams):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.dialect = dialect
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.report_offsets = report_offsets
+        self.fmtparams = fmtparams
+        self.offset = None
+        self._random = None # the file, kept open for `read_record`
+
+
+    def __iter__(self):
+        with open(self.path, 'rb', self.buffer_size) as f:
+            universal = _seek_line(f, self.start)
+            # records may be read again while iterating, see `read_record`
+            opened = self._random is None
+            if opened:
+                self.open()
+            try:
+                lines = _Lines(f, self.encoding, universal)
+                reader = csv.reader(lines, self.dialect, **self.fmtparams)
+                split = None
+                if not universal:
+                    split = _line_splitter(reader.dialect, self.encoding)
+                end = self.end
+                # lines before this are read one at a time
+                block_end = lines.offset
+                while end is None or lines.offset < end:
+                    # the reader never reads ahead, so the offset of the next
+                    # line is the offset of the next record
+                    offset = lines.offset
+                    if split is not None and offset >= block_end:
+                        size = self.buffer_size
+                        if end is not None:
+                            size = min(size, end - offset)
+                        block = f.read(size)
+                        if not block.endswith(b'\n'):
+                            block += f.readline() # read to the end of the line
+                        if not block:
+                            break
+                        lines.offset += len(block)
+                        split_block = split.block(block)
+                        if split_block is not None:
+                            records, parts, newline = split_block
+                            for r, part in zip(records, parts):
+                                self.offset = offset
+                                offset += len(part) + newline
+                                yield r
+                            continue
+                        # read the lines of the block one at a time instead
+                        f.seek(offset)
+                        lines.offset = offset
+                        block_end = offset + len(block)
+                    try:
+                        if split is None:
+                            r = next(reader)
+                        else:
+                            line = next(lines)
+                            r = split(line)
+                            if r is None:
+                                # leave the line to the reader
+                                lines.push(line)
+                                r = next(reader)
+                    except StopIteration:
+                        break
+                    self.offset = offset
+                    yield r
+            finally:
+                if opened:
+                    self.close()
+
+
+    def read_record(self, offset):
+        """Return the record starting at byte `offset`."""
+
+        if self._random is None:
+            return _read_record(self.path, offset, self.dialect,
+                                self.encoding, self.fmtparams)
+        f, universal = self._random
+        f.seek(offset)
+        lines = _Lines(f, self.encoding, universal)
+        for r in csv.reader(lines, self.dialect, **self.fmtparams):
+            return r
+
+
+    def open(self):
+        """Keep the file open for `read_record`, until `close` is called."""
+
+        f = open(self.path, 'rb')
+        self._random = f, _seek_line(f, self.start)
+
+
+    def close(self):
+        if self._random is not None:
+            self._random[0].close()
+            self._random = None
+
+
+def _seek_line(f, start, size=1 << 16):
+    """
+    Move binary file `f` to the start of the first line starting at or after
+    byte offset `start`, and return True if lines may end with a carriage return
+    alone, as well as a line feed or both, because there is a carriage return
+    which is not followed by a line feed in the `size` bytes from `start`.
+
+    """
+
+    f.seek(max(start - 1, 0))
+    data = f.read(size)
+    f.seek(max(start - 1, 0))
+    if data.endswith(b'\r'):
+        data = data[:-1] # may be followed by a line feed
+    universal = data.count(b'\r') != data.count(b'\r\n')
+    if start > 0:
+        # skip to the start of the next line, unless already there
+        if universal:
+            f.seek(start - 1 + len(_UniversalLines(f).readline()))
+        else:
+            f.readline()
+    return universal
+
+
+class _Lines(object):
+    """
+    Iterate over the lines of binary file `f`, keeping track of the byte offset
+    of the next line, and decoding lines on Python 3. Lines end with a line
+    feed or, if `universal` is true, a carriage return, a line feed or both.
+
+    """
+
+
+    def __init__(self, f, encoding, universal=False):
+        self._readline = f.readline
+        if universal:
+            self._readline = _UniversalLines(f).readline
+        self._encoding = encoding
+        self._pushed = None
+        self.offset = f.tell()
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        line = self._pushed
+        if line is not None:
+            self._pushed = None
+            return line
+        line = self._readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        if _PY2:
+            return line
+        return line.decode(self._encoding)
+
+
+    next = __next__ # Python 2
+
+
+    def push(self, line):
+        """Push back `line`, the line just returned, to be returned again."""
+
+        self._pushed = line
+
+
+class _UniversalLines(object):
+    """
+    Read lines ending with a carriage return, a line feed or both from binary
+    file `f`, reading blocks of `size` bytes, so that a file without line feeds
+    is not read as one line.
+
+    """
+
+    __slots__ = ('_read', '_size', '_data', '_position')
+
+
+    def __init__(self, f, size=io.DEFAULT_BUFFER_SIZE):
+        self._read = f.read
+        self._size = size
+        self._data = b''
+        self._position = 0
+
+
+    def readline(self):
+        """Return the next line, or an empty string at the end of the file."""
+
+        data, position = self._data, self._position
+        while True:
+            cr = data.find(b'\r', position)
+            lf = data.find(b'\n', position)
+            if lf >= 0 and (cr < 0 or lf < cr):
+                end = lf + 1
+                break
+            if 0 <= cr < len(data) - 1:
+                end = cr + 2 if data[cr + 1:cr + 2] == b'\n' else cr + 1
+                break
+            # the line may continue in the next block
+            block = self._read(self._size)
+            if not block:
+                end = len(data)
+                break
+            data = data[position:] + block
+            position = 0
+        self._data, self._position = data, end
+        return data[position:end]
+
+
+# the size of the blocks read from a file by `CSVValidator.validate_file`,
+# larger blocks are slower to split, as more records are created at once
+_FILE_BUFFER_SIZE = 1 << 16
+
+
+def _line_splitter(dialect, encoding='utf-8'):
+    """
+    Return a function which splits a line read from a CSV file with the given
+    `dialect`, as resolved by `csv.reader`, into the record `csv.reader` would
+    return, or returns None if the line may need more than splitting, e.g.,
+    because it contains quotes. Return None if the dialect needs more than
+    splitting, e.g., because it skips initial spaces.
+
+    The function has a `block` attribute, a function which splits a block of
+    whole lines read from a file in binary mode, decoding it using `encoding`
+    on Python 3, into a list of records, the list of lines as text or bytes,
+    and the length of the line breaks, such that the byte length of a line is
+    the length of the line plus the length of the line breaks, or returns None
+    if any of the lines may need more than splitting, or the line breaks are
+    mixed.
+
+    """
+
+    if (dialect.quoting not in (csv.QUOTE_MINIMAL, csv.QUOTE_ALL,
+                                csv.QUOTE_NONE) or
+            dialect.escapechar is not None or dialect.skipinitialspace or
+            dialect.delimiter in '\r\n\0'):
+        return None
+    special = '\0'
+    if dialect.quoting != csv.QUOTE_NONE:
+        special += dialect.quotechar
+    search = re.compile('[\r%s]' % re.escape(special)).search
+    delimiter = dialect.delimiter
+    limit = csv.field_size_limit()
+    def split(line):
+        if line[-1:] == '\n':
+            line = line[:-1]
+        if line[-1:] == '\r':
+            line = line[:-1]
+        if not line:
+            return []
+        if search(line) is not None or len(line) > limit:
+            return None
+        return line.split(delimiter)
+    def block(data):
+        if _PY2:
+            text = data
+        else:
+            try:
+                text = data.decode(encoding)
+            except UnicodeDecodeError:
+                return None # leave the error to be raised for the line
+        for c in special:
+            if c in text:
+                return None
+        newline = '\n'
+        if '\r' in text:
+            # only if every line break is '\r\n'
+            n = text.count('\r\n')
+            if n != text.count('\r') or n != text.count('\n'):
+                return None
+            newline = '\r\n'
+        lines = text.split(newline)
+        if not lines[-1]:
+            lines.pop() # the block ends with a line break
+        if max(map(len, lines)) > limit:
+            return None
+        records = [line.split(delimiter) if line else [] for line in lines]
+        if len(text) == len(data):
+            parts = lines
+        else:
+            # characters aren't bytes, so find the byte length of lines
+            parts = data.split(newline.encode('ascii'))
+        return records, parts, len(newline)
+    split.block = block
+    return split
+
+
+def _read_record(path, offset, dialect='excel', encoding='utf-8',
+                 fmtparams=None):
+    """Return the record starting at byte `offset` in the CSV file at `path`."""
+
+    return _read_records(path, (offset,), dialect, encoding,
+                         fmtparams).get(offset)
+
+
+def _read_records(path, offsets, dialect='excel', encoding='utf-8',
+                  fmtparams=None):
+    """
+    Return a dictionary mapping each of the byte `offsets` at which records
+    start in the CSV file at `path` to the record, opening the file once and
+    reading the records in order of offset.
+
+    """
+
+    if fmtparams is None:
+        fmtparams = dict()
+    records = dict()
+    offsets = sorted(set(offsets))
+    if not offsets:
+        return records
+    with open(path, 'rb') as f:
+        universal = _seek_line(f, offsets[0])
+        for offset in offsets:
+            f.seek(offset)
+            lines = _Lines(f, encoding, universal)
+            for r in csv.reader(lines, dialect, **fmtparams):
+                records[offset] = r
+                break
+    return records
+
+
+def _count_records(path, start, end, dialect='excel', encoding='utf-8',
+                   fmtparams=None):
+    """
+    Return the number of records in the CSV file at `path` which start on lines
+    starting at or after byte offset `start` and before byte offset `end`, and
+    whether the last of them continues past the start of the next line at or
+    after `end`, e.g., because of a line break in a quoted value, assuming the
+    first line is not part of a record which started before `start`.
+
+    Records are counted as lines unless the lines contain quote or escape
+    characters, or carriage returns not followed by line feeds, in which case
+    they are read as by `_RecordReader`.
+
+    """
+
+    if fmtparams is None:
+        fmtparams = dict()
+    resolved = csv.reader((), dialect, **fmtparams).dialect
+    special = [resolved.escapechar]
+    if resolved.quoting != csv.QUOTE_NONE:
+        special.append(resolved.quotechar)
+    special = [c if _PY2 else c.encode(encoding) for c in special if c]
+    with open(path, 'rb') as f:
+        if not _seek_line(f, start):
+            # find the start of the next line at or after end
+            first = f.tell()
+            f.seek(max(first, end) - 1)
+            f.readline()
+            remaining = f.tell() - first
+            f.seek(first)
+            n = 0
+            last = b'\n'
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                if (any(c in chunk for c in special) or
+                        chunk.count(b'\r') != chunk.count(b'\r\n')):
+                    break # records may span lines, or lines end otherwise
+                n += chunk.count(b'\n')
+                last = chunk[-1:]
+                remaining -= len(chunk)
+            else:
+                if last != b'\n':
+                    n += 1 # the last line of the file has no line break
+                return n, False
+    reader = _RecordReader(path, start, None, dialect, encoding,
+                           buffer_size=_FILE_BUFFER_SIZE, **fmtparams)
+    n = 0
+    for r in reader:
+        if reader.offset >= end:
+            # the next record must start where the next shard starts reading
+            with open(path, 'rb') as f:
+                _seek_line(f, end)
+                return n, reader.offset != f.tell()
+        n += 1
+    # there is no next record, so the next shard must have no lines to read
+    with open(path, 'rb') as f:
+        _seek_line(f, end)
+        return n, f.read(1) != b''
+
+
+# the validator, file and options used by a worker process, see
+# `CSVValidator.validate_parallel`
+_shard_worker = None
+
+
+def _init_shard_worker(validator, path, options):
+    global _shard_worker
+    _shard_worker = validator, path, options
+
+
+def _count_shard(shard):
+    validator, path, options = _shard_worker
+    start, end = shard
+    return _count_records(path, start, end, *options[:3])
+
+
+def _validate_shard(task):
+    validator, path, options = _shard_worker
+    start, end, first = task
+    return validator._validate_shard(path, start, end, first, *options)
+
+
+class _Deferred(object):
+    """
+    A list of problems being found by an executor, yielded by
+    `CSVValidator._ivalidate_rows` in place of the problems themselves.
+
+    """
+
+    __slots__ = ('future', 'transform')
+
+    def __init__(self, future, transform=None):
+        self.future = future
+        self.transform = transform # applied to each problem, if given
+
+    def result(self):
+        problems = self.future.result()
+        if self.transform is not None:
+            problems = [self.transform(p) for p in problems]
+        return problems
+
+
+def _resolve_deferred(problems, window):
+    """
+    Return an iterator over `problems`, replacing each `_Deferred` item with the
+    problems found, in order, while keeping at most `window` items deferred.
+
+    """
+
+    pending = deque()
+    deferred = 0
+    try:
+        for p in problems:
+            pending.append(p)
+            if isinstance(p, _Deferred):
+                deferred += 1
+            while pending and (deferred > window or
+                               not isinstance(pending[0], _Deferred) or
+                               pending[0].future.done()):
+                p = pending.popleft()
+                if isinstance(p, _Deferred):
+                    deferred -= 1
+                    for q in p.result():
+                        yield q
+                else:
+                    yield p
+        while pending:
+            p = pending.popleft()
+            if isinstance(p, _Deferred):
+                for q in p.result():
+                    yield q
+            else:
+                yield p
+    finally:
+        # don't leave work behind if the caller stops early
+        for p in pending:
+            if isinstance(p, _Deferred):
+                p.future.cancel()
+
+
+class _RecordPolicy(object):
+    """
+    Applies a record retention `policy` to the problems found in `data`, see
+    the `record_policy` argument to `CSVValidator.ivalidate`.
+
+    Problems are also given the 'offset' of the record they were found in,
+    whatever the policy, if `data` provides byte offsets and has a true
+    `report_offsets` attribute, see `_RecordReader`.
+
+    """
+
+    POLICIES = ('reference', 'copy', 'none', 'offset')
+
+
+    def __init__(self, policy, data):
+        assert policy in _RecordPolicy.POLICIES, \
+            'unexpected record policy: %r' % policy
+        if policy == 'offset' and not hasattr(data, 'read_record'):
+            raise ValueError('data does not provide byte offsets')
+        self.policy = policy
+        self._data = data
+        # note the offset of each row if problems are to be given it
+        self._note = (policy == 'offset' or
+                      getattr(data, 'report_offsets', False))
+        self._offsets = dict() # maps the index of rows read to their offset
+        self._offset = None # of the row being validated
+        self._current = False # is the row being validated the last row read?
+
+
+    def read(self, start=0):
+        """Enumerate the rows of `data`, noting their offsets if needed."""
+
+        if not self._note:
+            return enumerate(self._data, start)
+        return self._read(start)
+
+
+    def _read(self, start):
+        data, offsets = self._data, self._offsets
+        for i, r in enumerate(data, start):
+            offsets[i] = data.offset
+            yield i, r
+
+
+    def read_rows(self, start=0):
+        """
+        As `rows(read(start))`, for rows which are validated as soon as they are
+        read, so the offset of the row being validated is simply the offset of
+        the row most recently read.
+
+        """
+
+        self._current = self._note
+        return enumerate(self._data, start)
+
+
+    def rows(self, rows):
+        """
+        Pass through `rows`, (index, record) pairs as read, noting the offset
+        of each row as it is validated if needed.
+
+        """
+
+        if not self._note:
+            return rows
+        return self._rows(rows)
+
+
+    def _rows(self, rows):
+        for i, r in rows:
+            self._offset = self._offsets.pop(i)
+            yield i, r
+
+
+    def apply(self, problems):
+        """
+        Apply the policy to `problems`, found in the rows most recently passed
+        through `rows`.
+
+        """
+
+        if self.policy == 'reference' and not self._note:
+            return problems
+        return self._apply(problems)
+
+
+    def _apply(self, problems):
+        for p in problems:
+            offset = self._data.offset if self._current else self._offset
+            if isinstance(p, _Deferred):
+                p.transform = partial(self.retain, offset=offset)
+            else:
+                self.retain(p, offset)
+            yield p
+
+
+    def retain(self, p, offset=None):
+        """Apply the policy to the problem `p`, found at byte `offset`."""
+
+        try:
+            r = p._record
+        except AttributeError:
+            return p # not found in a record
+        if self.policy == 'copy':
+            p._record = copy.copy(r)
+        elif self.policy == 'none':
+            del p._record
+        elif self.policy == 'offset':
+            del p._record
+            p._source = self._data
+        if self._note:
+            p.offset = offset
+        return p
+
+
+class _RecordView(MutableMapping):
+    """
+    A view of a record as a dictionary of values indexed by field name, with
+    None for any missing values, which does not copy the record.
+
+    The view is copied on first write, so that a function which modifies it does
+    not affect the record, and `reset` discards the copy, so that a single view
+    can be shared by all functions applied to the record. Use `copy` for a plain
+    dictionary, e.g., to keep the record or to serialise it as JSON.
+
+    """
+
+    __slots__ = ('_index', '_keys', '_record', '_copy')
+
+
+    def __init__(self, index, keys, record):
+        self._index = index
+        self._keys = keys
+        self._record = record
+        self._copy = None
+
+
+    def reset(self):
+        """Discard any changes made to the view."""
 
-        for predicate, code, message, modulus in self._record_predicates:
-            if i % modulus == 0: # support sampling
-                rdict = self._as_dict(r)
-                try:
-                    valid = predicate(rdict)
-                    if not valid:
-                        p = {'code': code}
-                        if not summarize:
-                            p['message'] = message
-                            p['row'] = i + 1
-                            p['record'] = r
-                            if context is not None: p['context'] = context
-                        yield p
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['row'] = i + 1
-                            p['record'] = r
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (predicate.__name__,
-                                                        predicate.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
+        self._copy = None
 
 
-    def _apply_unique_checks(self, i, r, unique_sets,
-                             summarize=False,
-                             context=None):
-        """Apply unique checks on `r`."""
-
-        for key, code, message in self._unique_checks:
-            value = None
-            values = unique_sets[key]
-            if isinstance(key, basestring): # assume key is a field name
-                fi = self._field_names.index(key)
-                if fi >= len(r):
-                    continue
-                value = r[fi]
-            else: # assume key is a list or tuple, i.e., compound key
-                value = []
-                for f in key:
-                    fi = self._field_names.index(f)
-                    if fi >= len(r):
-                        break
-                    value.append(r[fi])
-                value = tuple(value) # enable hashing
-            if value in values:
-                p = {'code': code}
-                if not summarize:
-                    p['message'] = message
-                    p['row'] = i + 1
-                    p['record'] = r
-                    p['key'] = key
-                    p['value'] = value
-                    if context is not None: p['context'] = context
-                yield p
-            values.add(value)
+    def __getitem__(self, key):
+        if self._copy is not None:
+            return self._copy[key]
+        fi = self._index[key]
+        r = self._record
+        return r[fi] if fi < len(r) else None
 
 
-    def _apply_each_methods(self, i, r,
-                            summarize=False,
-                            report_unexpected_exceptions=True,
-                            context=None):
-        """Invoke 'each' methods on `r`."""
+    def __contains__(self, key):
+        if self._copy is not None:
+            return key in self._copy
+        return key in self._index
 
-        for a in dir(self):
-            if a.startswith('each'):
-                rdict = self._as_dict(r)
-                f = getattr(self, a)
-                try:
-                    f(rdict)
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['row'] = i + 1
-                            p['record'] = r
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (f.__name__,
-                                                        f.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
 
+    def __iter__(self):
+        if self._copy is not None:
+            return iter(self._copy)
+        return iter(self._keys)
 
-    def _apply_assert_methods(self, i, r,
-                              summarize=False,
-                              report_unexpected_exceptions=True,
-                              context=None):
-        """Apply 'assert' methods on `r`."""
 
-        for a in dir(self):
-            if a.startswith('assert'):
-                rdict = self._as_dict(r)
-                f = getattr(self, a)
-                try:
-                    f(rdict)
-                except AssertionError as e:
-                    code = ASSERT_CHECK_FAILED
-                    message = MESSAGES[ASSERT_CHECK_FAILED]
-                    if len(e.args) > 0:
-                        custom = e.args[0]
-                        if isinstance(custom, (list, tuple)):
-                            if len(custom) > 0:
-                                code = custom[0]
-                            if len(custom) > 1:
-                                message = custom[1]
-                        else:
-                            code = custom
-                    p = {'code': code}
-                    if not summarize:
-                        p['message'] = message
-                        p['row'] = i + 1
-                        p['record'] = r
-                        if context is not None: p['context'] = context
-                    yield p
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['row'] = i + 1
-                            p['record'] = r
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (f.__name__,
-                                                        f.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
+    def __len__(self):
+        if self._copy is not None:
+            return len(self._copy)
+        return len(self._keys)
 
 
-    def _apply_check_methods(self, i, r,
-                              summarize=False,
-                              report_unexpected_exceptions=True,
-                              context=None):
-        """Apply 'check' methods on `r`."""
+    def __setitem__(self, key, value):
+        self._writable()[key] = value
 
-        for a in dir(self):
-            if a.startswith('check'):
-                rdict = self._as_dict(r)
-                f = getattr(self, a)
-                try:
-                    f(rdict)
-                except RecordError as e:
-                    code = e.code if e.code is not None else RECORD_CHECK_FAILED
-                    p = {'code': code}
-                    if not summarize:
-                        message = e.message if e.message is not None else MESSAGES[RECORD_CHECK_FAILED]
-                        p['message'] = message
-                        p['row'] = i + 1
-                        p['record'] = r
-                        if context is not None: p['context'] = context
-                        if e.details is not None: p['details'] = e.details
-                    yield p
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['row'] = i + 1
-                            p['record'] = r
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (f.__name__,
-                                                        f.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
 
+    def __delitem__(self, key):
+        del self._writable()[key]
 
-    def _apply_finally_assert_methods(self,
-                                      summarize=False,
-                                      report_unexpected_exceptions=True,
-                                      context=None):
-        """Apply 'finally_assert' methods."""
 
-        for a in dir(self):
-            if a.startswith('finally_assert'):
-                f = getattr(self, a)
-                try:
-                    f()
-                except AssertionError as e:
-                    code = ASSERT_CHECK_FAILED
-                    message = MESSAGES[ASSERT_CHECK_FAILED]
-                    if len(e.args) > 0:
-                        custom = e.args[0]
-                        if isinstance(custom, (list, tuple)):
-                            if len(custom) > 0:
-                                code = custom[0]
-                            if len(custom) > 1:
-                                message = custom[1]
-                        else:
-                            code = custom
-                    p = {'code': code}
-                    if not summarize:
-                        p['message'] = message
-                        if context is not None: p['context'] = context
-                    yield p
-                except Exception as e:
-                    if report_unexpected_exceptions:
-                        p = {'code': UNEXPECTED_EXCEPTION}
-                        if not summarize:
-                            p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                            p['exception'] = e
-                            p['function'] = '%s: %s' % (f.__name__,
-                                                        f.__doc__)
-                            if context is not None: p['context'] = context
-                        yield p
+    def _writable(self):
+        if self._copy is None:
+            self._copy = self.copy()
+        return self._copy
 
 
-    def _apply_skips(self, i, r,
-                     summarize=False,
-                     report_unexpected_exceptions=True,
-                     context=None):
-        """Apply skip functions on `r`."""
+    def copy(self):
+        """Return the record, with any changes, as a new dictionary."""
 
-        for skip in self._skips:
-            try:
-                result = skip(r)
-                if result is True:
-                    yield True
-            except Exception as e:
-                if report_unexpected_exceptions:
-                    p = {'code': UNEXPECTED_EXCEPTION}
-                    if not summarize:
-                        p['message'] = MESSAGES[UNEXPECTED_EXCEPTION] % (e.__class__.__name__, e)
-                        p['row'] = i + 1
-                        p['record'] = r
-                        p['exception'] = e
-                        p['function'] = '%s: %s' % (skip.__name__,
-                                                    skip.__doc__)
-                        if context is not None: p['context'] = context
-                    yield p
+        if self._copy is not None:
+            return dict(self._copy)
+        return dict((k, self[k]) for k in self._keys)
 
 
-    def _as_dict(self, r):
-        """Convert the record to a dictionary using field names as keys."""
+    def __repr__(self):
+        return repr(dict(self.items()))
 
-        d = dict()
-        for i, f in enumerate(self._field_names):
-            d[f] = r[i] if i < len(r) else None
-        return d
+
+class _Column(object):
+    """
+    The values of the field at index `fi` in `rows`, a list of (index, record)
+    pairs, for the rows which have a value.
+
+    """
+
+    __slots__ = ('rows', 'values', '_array')
+
+
+    def __init__(self, fi, rows):
+        try:
+            self.values = [r[fi] for i, r in rows]
+            self.rows = rows
+        except IndexError: # some rows have no value
+            self.rows = [(i, r) for i, r in rows if fi < len(r)]
+            self.values = [r[fi] for i, r in self.rows]
+        self._array = None
+
+
+    def array(self):
+        """
+        Return the values as a NumPy array, if NumPy is installed, otherwise as
+        a list.
+
+        """
+
+        if self._array is None:
+            if np is None:
+                self._array = self.values
+            else:
+                self._array = _as_object_array(self.values)
+        return self._array
+
+
+class _Stage(object):
+    """
+    An immutable sequence of compiled checks of one kind, where each check may
+    be applied to every nth record only.
+
+    """
+
+    __slots__ = ('items', 'item_moduli', 'moduli', '_selections')
+
+
+    def __init__(self, items, item_moduli=None):
+        self.items = tuple(items)
+        if item_moduli is None:
+            item_moduli = (1,) * len(self.items)
+        self.item_moduli = tuple(item_moduli)
+        # distinct moduli other than 1, the only ones that need evaluating
+        self.moduli = tuple(sorted(set(m for m in self.item_moduli if m != 1)))
+        self._selections = dict()
+
+
+    def select(self, i):
+        """Return the checks to apply on the record at index `i`."""
+
+        if not self.moduli:
+            return self.items
+        key = tuple(i % m == 0 for m in self.moduli)
+        try:
+            return self._selections[key]
+        except KeyError:
+            selection = tuple(item for item, m
+                              in zip(self.items, self.item_moduli)
+                              if i % m == 0)
+            self._selections[key] = selection
+            return selection
+
+
+class _ValidationPlan(object):
+    """
+    An immutable snapshot of the checks added to a `CSVValidator`, with field
+    names resolved to column indices, see also `CSVValidator.compile`.
+
+    """
+
+    __slots__ = ('field_index', 'field_keys',
+                 'header_checks', 'record_length_checks', 'value_checks',
+                 'value_predicates', 'record_checks', 'record_predicates',
+                 'unique_checks', 'unique_options', 'skips', 'each_methods', 'check_methods',
+                 'assert_methods', 'finally_assert_methods', 'dependencies')
+
+
+    def __init__(self, validator):
+        # field names resolve to their first column, but records as
+        # dictionaries have the value in the last column, if names are repeated
+        index = dict()
+        for fi, f in enumerate(validator._field_names):
+            index.setdefault(f, fi)
+        set_attr = super(_ValidationPlan, self).__setattr__
+        set_attr('field_index', dict((f, fi) for fi, f
+                                     in enumerate(validator._field_names)))
+        keys = list()
+        for f in validator._field_names:
+            if f not in keys:
+                keys.append(f)
+        set_attr('field_keys', tuple(keys))
+        set_attr('header_checks', tuple(validator._header_checks))
+        set_attr('record_length_checks', _Stage(
+            ((code, message)
+             for code, message, modulus in validator._record_length_checks),
+            (t[-1] for t in validator._record_length_checks)))
+        set_attr('value_checks', _Stage(
+            ((index[field_name], field_name, check, code, message)
+             for field_name, check, code, message, modulus
+             in _fuse_patterns(validator._value_checks)),
+            (t[-1] for t in validator._value_checks)))
+        set_attr('value_predicates', _Stage(
+            ((index[field_name], field_name, predicate, code, message)
+             for field_name, predicate, code, message, modulus
+             in validator._value_predicates),
+            (t[-1] for t in validator._value_predicates)))
+        set_attr('record_checks', _Stage(
+            (check for check, fields, modulus in validator._record_checks),
+            (t[-1] for t in validator._record_checks)))
+        set_attr('record_predicates', _Stage(
+            ((predicate, code, message)
+             for predicate, code, message, fields, modulus
+             in validator._record_predicates),
+            (t[-1] for t in validator._record_predicates)))
+        # map record level functions to the column indices they depend on
+        dependencies = dict()
+        def depend(f, fields):
+            if fields is not None:
+                fi = frozenset(index[field_name] for field_name in fields)
+                dependencies[f] = dependencies.get(f, frozenset()) | fi
+        for check, fields, modulus in validator._record_checks:
+            depend(check, fields)
+        for t in validator._record_predicates:
+            depend(t[0], t[3])
+        unique_checks = list()
+        unique_options = list()
+        for key, code, message, options in validator._unique_checks:
+            unique_options.append(options)
+            if isinstance(key, basestring):
+                unique_checks.append((key, False, index[key], code, message))
+            else:
+                fi = tuple(index[f] for f in key)
+                unique_checks.append((key, True, fi, code, message))
+        set_attr('unique_checks', tuple(unique_checks))
+        set_attr('unique_options', tuple(unique_options))
+        set_attr('skips', tuple(validator._skips))
+        registry = validator._discover_methods()
+        for prefix in validator._METHOD_PREFIXES:
+            # methods may also be set as attributes of the instance
+            names = set(registry[prefix])
+            names.update(a for a in vars(validator) if a.startswith(prefix))
+            methods = tuple(getattr(validator, a) for a in sorted(names))
+            set_attr(prefix + '_methods', methods)
+            if prefix in ('check', 'assert'):
+                for f in methods:
+                    depend(f, validator._check_dependencies(f, None))
+        set_attr('dependencies', dependencies)
+
+
+    def unaffected(self, items, failed):
+        """
+        Return the record check functions, record predicates or methods in
+        `items` which do not depend on any of the column indices in `failed`.
+
+        """
+
+        dependencies = self.dependencies
+        selection = list()
+        for item in items:
+            f = item[0] if isinstance(item, tuple) else item
+            if failed.isdisjoint(dependencies.get(f, ())):
+                selection.append(item)
+        return tuple(selection)
+
+
+    def coroutine_functions(self):
+        """
+        Return the names of the coroutine functions in this plan, which can only
+        be applied by `CSVValidator.aivalidate`.
+
+        """
+
+        iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+        if iscoroutinefunction is None: # no coroutine functions before 3.5
+            return []
+        names = list()
+        for name, fi, failures, fails in _ValidationPlan._MEASURED:
+            stage = getattr(self, name)
+            for item in getattr(stage, 'items', stage):
+                f = item if fi is None else item[fi]
+                if iscoroutinefunction(f):
+                    names.append(_function_name(f))
+        return names
+
+
+    # the stages of functions which may be measured, with the position of the
+    # function in each item, if not the item itself, the exceptions which
+    # signal a problem, and a function of the result which is true if the result
+    # signals a problem, if any
+    _MEASURED = (('skips', None, (), partial(operator.is_, True)),
+                 ('each_methods', None, (), None),
+                 ('value_checks', 2, ValueError, None),
+                 ('value_predicates', 2, (), operator.not_),
+                 ('record_checks', None, RecordError, None),
+                 ('record_predicates', 0, (), operator.not_),
+                 ('check_methods', None, RecordError, None),
+                 ('assert_methods', None, AssertionError, None),
+                 ('finally_assert_methods', None, AssertionError, None))
+
+    # the stages of functions which may be reordered
+    _REORDERED = ('value_checks', 'value_predicates', 'record_checks',
+                  'record_predicates')
+
+
+    def measured(self, names=_REORDERED):
+        """
+        Return a copy of this plan in which the functions in the stages with the
+        given `names` record statistics on the calls made to them, and the
+        statistics, a dictionary mapping stage name to a list of `_CheckStats`,
+        one per item.
+
+        """
+
+        stages = dict()
+        stats = dict()
+        dependencies = dict(self.dependencies)
+        for name, fi, failures, fails in _ValidationPlan._MEASURED:
+            if name not in names:
+                continue
+            stage = getattr(self, name)
+            items = list()
+            stats[name] = list()
+            for item in getattr(stage, 'items', stage):
+                s = _CheckStats()
+                stats[name].append(s)
+                f = item if fi is None else item[fi]
+                m = _Measured(f, s, failures, fails)
+                if f in self.dependencies:
+                    dependencies[m] = self.dependencies[f]
+                if fi is None:
+                    items.append(m)
+                else:
+                    items.append(item[:fi] + (m,) + item[fi + 1:])
+            if isinstance(stage, _Stage):
+                stages[name] = _Stage(items, stage.item_moduli)
+            else:
+                stages[name] = tuple(items)
+        return self.replace(dependencies=dependencies, **stages), stats
+
+
+    def reordered(self, stats):
+        """
+        Return a copy of this plan in which the items of the stages that may be
+        reordered are in order of the proportion of calls which found a problem,
+        given `stats` as returned by `measured`, see `CSVValidator.ivalidate`.
+
+        """
+
+        stages = dict()
+        for name in _ValidationPlan._REORDERED:
+            stage = getattr(self, name)
+            ranks = [(s.rank(), k) for k, s in enumerate(stats[name])]
+            order = [k for rank, k in sorted(ranks)]
+            stages[name] = _Stage([stage.items[k] for k in order],
+                                  [stage.item_moduli[k] for k in order])
+        return self.replace(**stages)
+
+
+    def replace(self, **attrs):
+        """Return a copy of this plan with the given attributes replaced."""
+
+        plan = object.__new__(_ValidationPlan)
+        set_attr = super(_ValidationPlan, plan).__setattr__
+        for name in self.__slots__:
+            set_attr(name, attrs.pop(name, getattr(self, name)))
+        assert not attrs, 'unknown attributes: %r' % sorted(attrs)
+        return plan
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError('validation plan is immutable')
+
+
+class _CheckStats(object):
+    """Statistics on the calls made to a check function."""
+
+    __slots__ = ('calls', 'time', 'max_time', 'failures', 'exceptions')
+
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0 # seconds
+        self.max_time = 0.0
+        self.failures = 0 # calls which found a problem
+        self.exceptions = 0 # calls which raised an unexpected exception
+
+
+    def rank(self):
+        """
+        Return a key to sort checks by the proportion of calls which found a
+        problem, highest first, which unlike the time taken does not vary from
+        one run to the next.
+
+        """
+
+        if not self.calls:
+            return 1, 0.0
+        return 0, -float(self.failures + self.exceptions) / self.calls
+
+
+class _Measured(object):
+    """
+    Stands in for `function` in a validation plan, recording `stats` on calls
+    made to it. A call fails if it raises one of `failures`, or if `fails` is
+    given and returns true for the result.
+
+    """
+
+    def __init__(self, function, stats, failures=(), fails=None):
+        self.function = function
+        self.stats = stats
+        self.failures = failures
+        self.fails = fails
+        # used to report unexpected exceptions
+        self.__name__ = getattr(function, '__name__', type(function).__name__)
+        self.__doc__ = function.__doc__
+
+
+    def __call__(self, *args):
+        stats = self.stats
+        start = default_timer()
+        try:
+            result = self.function(*args)
+        except self.failures:
+            stats.failures += 1
+            raise
+        except Exception:
+            stats.exceptions += 1
+            raise
+        else:
+            if self.fails is not None and self.fails(result):
+                stats.failures += 1
+            return result
+        finally:
+            elapsed = default_timer() - start
+            stats.calls += 1
+            stats.time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+
+
+# patterns for the numeric directives exactly as used by `datetime.strptime`,
+# and the literal characters allowed with them, for `_datetime_parser`
+_STRPTIME_DIRECTIVES = {
+    'Y': r'(\d\d\d\d)',
+    'm': r'(1[0-2]|0[1-9]|[1-9])',
+    'd': r'(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+    'H': r'(2[0-3]|[0-1]\d|\d)',
+    'M': r'([0-5]\d|\d)',
+    'S': r'(6[0-1]|[0-5]\d|\d)',
+    }
+_STRPTIME_LITERALS = '-/:.,T_'
+
+
+def _strptime_tokens(format):
+    """
+    Split `format` into a list of directives, e.g., '%Y', and literal
+    characters, with any run of spaces as a single space, or return None if
+    `format` is not made of the directives in `_STRPTIME_DIRECTIVES`, each at
+    most once and including %Y, %m and %d, and the characters in
+    `_STRPTIME_LITERALS` or spaces.
+
+    """
+
+    tokens = list()
+    k = 0
+    while k < len(format):
+        c = format[k]
+        if c == '%':
+            token = format[k:k + 2]
+            if token[1:] not in _STRPTIME_DIRECTIVES or token in tokens:
+                return None
+            k += 2
+        elif c == ' ':
+            token = ' '
+            while format[k:k + 1] == ' ':
+                k += 1
+        elif c in _STRPTIME_LITERALS:
+            token = c
+            k += 1
+        else:
+            return None
+        tokens.append(token)
+    if not set(['%Y', '%m', '%d']).issubset(tokens):
+        return None
+    return tokens
+
+
+def _datetime_parser(format):
+    """
+    Return a function which converts a string to a datetime using `format`,
+    accepting and rejecting exactly the same strings as `datetime.strptime`.
+
+    Formats made of the directives %Y, %m, %d, %H, %M and %S, each at most once
+    and including %Y, %m and %d, separated by spaces or any of the characters
+    in `_STRPTIME_LITERALS`, e.g., '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S' or
+    '%d/%m/%Y', are compiled into a single regular expression, the same one
+    `datetime.strptime` would use. For all other formats, the function calls
+    `datetime.strptime`.
+
+    """
+
+    tokens = _strptime_tokens(format)
+    if tokens is None:
+        def strptime(v):
+            return datetime.strptime(v, format)
+        return strptime
+    pattern = list()
+    order = list()
+    for token in tokens:
+        if token.startswith('%'):
+            order.append(token[1])
+            pattern.append(_STRPTIME_DIRECTIVES[token[1]])
+        elif token == ' ':
+            # as for strptime, any run of whitespace matches any whitespace
+            pattern.append(r'\s+')
+        else:
+            pattern.append(re.escape(token))
+    # strptime ignores case, e.g., 't' matches 'T'
+    match = re.compile(''.join(pattern), re.IGNORECASE).match
+    positions = tuple(order.index(d) for d in 'YmdHMS' if d in order)
+    def parse(v):
+        m = match(v)
+        if m is None or m.end() != len(v):
+            raise ValueError('time data %r does not match format %r'
+                             % (v, format))
+        values = m.groups()
+        return datetime(*[int(values[j]) for j in positions])
+    return parse
+
+
+# patterns for the numeric directives which only match zero padded values that
+# are valid in any month, with the width of the values, for `_datetime_shape`
+_SHAPE_DIRECTIVES = {
+    'Y': (r'(?!0000)[0-9]{4}', 4),
+    'm': (r'(?:0[1-9]|1[0-2])', 2),
+    'd': (r'(?:0[1-9]|1[0-9]|2[0-8])', 2),
+    'H': (r'(?:[01][0-9]|2[0-3])', 2),
+    'M': (r'[0-5][0-9]', 2),
+    'S': (r'[0-5][0-9]', 2),
+    }
+
+
+def _datetime_shape(format):
+    """
+    If the strings of `format` sort in the same order as the datetimes they
+    represent, i.e., for zero padded formats with the most significant
+    directive first such as '%Y-%m-%d' or '%Y%m%d %H:%M:%S', return a function
+    which returns a match if a string has the exact shape of a valid datetime
+    in `format`, without building a datetime, and a function which formats a
+    datetime as a string of that shape; otherwise return None.
+
+    Strings of that shape sort as the datetimes they represent, so can be
+    compared as strings. Strings which strptime accepts which do not have that
+    shape, e.g., dates after the 28th or values which are not zero padded, must
+    be parsed.
+
+    """
+
+    tokens = _strptime_tokens(format)
+    if tokens is None:
+        return None
+    directives = [t[1] for t in tokens if t.startswith('%')]
+    if directives != list('YmdHMS'[:len(directives)]):
+        return None # not most significant first
+    pattern = list()
+    template = list()
+    for token in tokens:
+        if token.startswith('%'):
+            regex, width = _SHAPE_DIRECTIVES[token[1]]
+            pattern.append(regex)
+            template.append('%%0%sd' % width)
+        else:
+            pattern.append(re.escape(token))
+            template.append(token)
+    match = re.compile(''.join(pattern) + r'\Z').match
+    template = ''.join(template)
+    def format_datetime(d):
+        fields = (d.year, d.month, d.day, d.hour, d.minute, d.second)
+        return template % fields[:len(directives)]
+    return match, format_datetime
+
+
+def _as_object_array(values):
+    """
+    Return `values` as a one-dimensional NumPy array of Python objects, which
+    unlike an array of strings does not strip trailing null characters.
+
+    """
+
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return values
+    a = np.empty(len(values), dtype=object)
+    a[:] = values
+    return a
+
+
+def _candidates(values, test):
+    """
+    Return the positions of `values` for which `test` returns true or raises an
+    exception, one value at a time, for batch functions which can't apply a
+    faster test to all values at once, e.g., because some are not strings.
+
+    """
+
+    candidates = list()
+    for j, v in enumerate(values):
+        try:
+            if test(v):
+                candidates.append(j)
+        except Exception:
+            candidates.append(j)
+    return candidates
+
+
+def depends_on(*field_names):
+    """
+    Return a decorator which declares the names of the fields a record check
+    function, record predicate, or 'check' or 'assert' method depends on. The
+    function is then not applied to records in which a value check or value
+    predicate on any of these fields has failed, e.g.::
+
+        @depends_on('age_years', 'age_months')
+        def check_age(self, r):
+            ...
+
+    """
+
+    def decorator(f):
+        f.depends_on = field_names
+        return f
+    return decorator
 
 
 def enumeration(*args):
@@ -925,6 +4072,10 @@ def enumeration(*args):
     If you pass in more than on argument, it is assumed the arguments themselves
     define the enumeration.
 
+    Members given as a list, tuple or set are kept as a frozen set, so checking
+    a value takes the same time however many members there are. See also
+    `enumeration_from_file`.
+
     """
 
     assert len(args) > 0, 'at least one argument is required'
@@ -934,12 +4085,139 @@ def enumeration(*args):
     else:
         # assume the arguments are the members
         members = args
+    given = members
+    if isinstance(members, (list, tuple, set)):
+        try:
+            members = frozenset(members)
+        except TypeError:
+            pass # some members are not hashable
+    def checker(value):
+        try:
+            found = value in members
+        except TypeError: # value is not hashable
+            found = value in given
+        if not found:
+            raise ValueError(value)
+    if isinstance(members, frozenset):
+        def batch(values):
+            try:
+                return [j for j, v in enumerate(values) if v not in members]
+            except TypeError: # some values are not hashable
+                return _candidates(values, lambda v: v not in given)
+        checker.batch = batch
+    return checker
+
+
+def enumeration_from_file(path, strip=False, ignore_case=False, compact=False,
+                          encoding='utf-8'):
+    """
+    Return a value check function which raises a ValueError if the value is not
+    one of the members listed in the file at `path`, one per line. Blank lines
+    are ignored.
+
+    Arguments
+    ---------
+
+    `path` - the path of the file listing the members
+
+    `strip` - ignore leading and trailing whitespace, in both members and
+    values
+
+    `ignore_case` - ignore case, in both members and values
+
+    `compact` - keep the members as a single sorted byte string, searched by
+    bisection, rather than as a set - useful for very large numbers of members,
+    as this uses much less memory, and stays shared between processes forked
+    after it is created, e.g., by `CSVValidator.validate_parallel`, but takes
+    longer to check each value
+
+    `encoding` - the character encoding of the file
+
+    """
+
+    if strip and ignore_case:
+        normalize = lambda v: v.strip().lower()
+    elif strip:
+        normalize = lambda v: v.strip()
+    elif ignore_case:
+        normalize = lambda v: v.lower()
+    else:
+        normalize = None
+    members = list()
+    with open(path, 'rb') as f:
+        for line in f.read().splitlines():
+            m = line.decode(encoding)
+            if normalize is not None:
+                m = normalize(m) # once per member
+            if m:
+                members.append(m.encode(encoding) if _PY2 else m)
+    if compact:
+        members = _SortedMembers(members, encoding)
+    elif normalize is None:
+        return enumeration(frozenset(members))
+    else:
+        members = frozenset(members)
     def checker(value):
-        if value not in members:
+        v = value if normalize is None else normalize(value)
+        if v not in members:
             raise ValueError(value)
     return checker
 
 
+class _SortedMembers(object):
+    """
+    A compact immutable set of strings, kept as a single sorted byte string of
+    the encoded members and an array of their offsets, and searched by
+    bisection. Unlike a set of strings, it is never written to when used, so it
+    stays shared between processes forked after it is created.
+
+    """
+
+    __slots__ = ('_data', '_offsets', '_encoding')
+
+
+    def __init__(self, members, encoding='utf-8'):
+        encoded = sorted(set(m if isinstance(m, bytes) else m.encode(encoding)
+                             for m in members))
+        self._data = b''.join(encoded)
+        offsets = array('L', [0])
+        offset = 0
+        for m in encoded:
+            offset += len(m)
+            offsets.append(offset)
+        self._offsets = offsets
+        self._encoding = encoding
+
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+    def __iter__(self):
+        data, offsets = self._data, self._offsets
+        for j in range(len(self)):
+            m = data[offsets[j]:offsets[j + 1]]
+            yield m if _PY2 else m.decode(self._encoding)
+
+
+    def __contains__(self, value):
+        if not isinstance(value, bytes):
+            try:
+                value = value.encode(self._encoding)
+            except AttributeError: # not a string
+                return False
+        data, offsets = self._data, self._offsets
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[offsets[mid]:offsets[mid + 1]] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return (lo < len(offsets) - 1 and
+                data[offsets[lo]:offsets[lo + 1]] == value)
+
+
 def match_pattern(regex):
     """
     Return a value check function which raises a ValueError if the value does
@@ -952,6 +4230,14 @@ def match_pattern(regex):
         result = prog.match(v)
         if result is None:
             raise ValueError(v)
+    def batch(values):
+        match = prog.match
+        try:
+            return [j for j, v in enumerate(values) if match(v) is None]
+        except TypeError: # some values are not strings
+            return _candidates(values, lambda v: match(v) is None)
+    checker.batch = batch
+    checker.pattern = prog # used by _fuse_patterns
     return checker
 
 
@@ -968,9 +4254,125 @@ def search_pattern(regex):
         result = prog.search(v)
         if result is None:
             raise ValueError(v)
+    def batch(values):
+        search = prog.search
+        try:
+            return [j for j, v in enumerate(values) if search(v) is None]
+        except TypeError: # some values are not strings
+            return _candidates(values, lambda v: search(v) is None)
+    checker.batch = batch
     return checker
 
 
+# constructs which can't be used in a pattern combined with other patterns:
+# backreferences, conditionals, and inline flags, which apply to the whole
+# pattern on Python 2
+_UNFUSABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux-]')
+
+
+def _fuse_patterns(value_checks):
+    """
+    Return `value_checks`, as added to a validator, replacing the value check
+    functions returned by `match_pattern` where there are two or more for the
+    same field and modulus with functions which share a single regular
+    expression, see `_FusedPatterns`.
+
+    The functions returned by `search_pattern` are left alone, as a regular
+    expression combining them would have to scan the value once for each of
+    them anyway, and more slowly than searching.
+
+    """
+
+    groups = dict()
+    for k, t in enumerate(value_checks):
+        field_name, check, modulus = t[0], t[1], t[-1]
+        prog = getattr(check, 'pattern', None)
+        if prog is None:
+            continue
+        if (not isinstance(prog.pattern, basestring) or
+                prog.flags != re.compile(prog.pattern).flags or
+                _UNFUSABLE.search(prog.pattern)):
+            continue # not fusable
+        groups.setdefault((field_name, modulus), list()).append(k)
+    value_checks = list(value_checks)
+    for positions in groups.values():
+        if len(positions) < 2:
+            continue
+        fused = _FusedPatterns([value_checks[k][1] for k in positions])
+        if fused.match is None:
+            continue # patterns could not be combined
+        for k in positions:
+            t = value_checks[k]
+            value_checks[k] = (t[0], fused.checker(t[1])) + t[2:]
+    return value_checks
+
+
+class _FusedPatterns(object):
+    """
+    Applies the regular expressions of several `checks`, as returned by
+    `match_pattern`, to a value in a single pass, with a regular expression of
+    one lookahead per check, which only matches values which pass all the
+    checks. Each of the functions returned by `checker`
+    stands in for one of the checks, and only applies the check's own regular
+    expression, to find out whether that check failed, if the value didn't
+    pass all the checks.
+
+    """
+
+    def __init__(self, checks):
+        parts = list()
+        for check in checks:
+            parts.append(r'(?=(?:%s))' % check.pattern.pattern)
+        try:
+            self.match = re.compile(''.join(parts)).match
+        except re.error:
+            self.match = None
+        # the most recent value and whether it passed all the checks
+        self._last = [None, False]
+        # the most recent values of a batch and the indices of those which
+        # didn't pass all the checks
+        self._last_batch = [None, None]
+
+
+    def batch(self, values):
+        """Return the indices of `values` which don't pass all the checks."""
+
+        last = self._last_batch
+        if values is not last[0]:
+            last[1] = None
+            match = self.match
+            try:
+                last[1] = [j for j, v in enumerate(values) if match(v) is None]
+            except TypeError: # some values are not strings
+                last[1] = _candidates(values, lambda v: match(v) is None)
+            last[0] = values
+        return last[1]
+
+
+    def checker(self, check):
+        """Return a function which stands in for `check`."""
+
+        match = self.match
+        last = self._last
+        own = check.pattern.match
+        def checker(v):
+            if v is not last[0]:
+                last[0] = None
+                last[1] = match(v) is not None
+                last[0] = v
+            if not last[1] and own(v) is None:
+                raise ValueError(v)
+        def batch(values):
+            found = self.batch(values)
+            return [found[k] for k in _candidates([values[j] for j in found],
+                                                  lambda v: own(v) is None)]
+        checker.__name__ = check.__name__
+        checker.__doc__ = check.__doc__
+        checker.batch = batch # used by ivalidate_batches
+        checker._registered = check # see _registered
+        return checker
+
+
 def number_range_inclusive(min, max, type=float):
     """
     Return a value check function which raises a ValueError if the supplied
@@ -981,6 +4383,7 @@ def number_range_inclusive(min, max, type=float):
     def checker(v):
         if type(v) < min or type(v) > max:
             raise ValueError(v)
+    checker.batch = _number_range_batch(type, lambda x: (x < min) | (x > max))
     return checker
 
 
@@ -995,9 +4398,36 @@ def number_range_exclusive(min, max, type=float):
     def checker(v):
         if type(v) <= min or type(v) >= max:
             raise ValueError(v)
+    checker.batch = _number_range_batch(type,
+                                        lambda x: (x <= min) | (x >= max))
     return checker
 
 
+def _number_range_batch(type, outside):
+    """
+    Return a batch function for a number range check, returning the positions
+    of values which can't be converted by `type`, or for which `outside` is true
+    of the converted value. If NumPy is installed and `type` is int or float,
+    all values are converted and compared at once, unless any can't be.
+
+    """
+
+    def batch(values):
+        if np is not None and type in (int, float):
+            try:
+                a = _as_object_array(values).astype(type)
+            except (TypeError, ValueError, OverflowError):
+                pass # some values can't be converted, so check one at a time
+            else:
+                with np.errstate(invalid='ignore'): # comparisons with nan
+                    found = outside(a)
+                if type is float:
+                    found |= np.isnan(a) # e.g., None, so check one at a time
+                return np.flatnonzero(found)
+        return _candidates(values, lambda v: outside(type(v)))
+    return batch
+
+
 def datetime_string(format):
     """
     Return a value check function which raises a ValueError if the supplied
@@ -1007,8 +4437,23 @@ def datetime_string(format):
 
     """
 
-    def checker(v):
-        datetime.strptime(v, format)
+    parse = _datetime_parser(format)
+    shape = _datetime_shape(format)
+    if shape is None:
+        def checker(v):
+            parse(v)
+    else:
+        match = shape[0]
+        def checker(v):
+            if match(v) is None: # otherwise v is valid
+                parse(v)
+        def batch(values):
+            # values of other shapes may still be valid, so are candidates
+            try:
+                return [j for j, v in enumerate(values) if match(v) is None]
+            except TypeError: # some values are not strings
+                return _candidates(values, lambda v: match(v) is None)
+        checker.batch = batch
     return checker
 
 
@@ -1022,10 +4467,33 @@ def datetime_range_inclusive(min, max, format):
 
     dmin = datetime.strptime(min, format)
     dmax = datetime.strptime(max, format)
-    def checker(v):
-        dv = datetime.strptime(v, format)
-        if dv < dmin or dv > dmax:
-            raise ValueError(v)
+    parse = _datetime_parser(format)
+    shape = _datetime_shape(format)
+    if shape is None:
+        def checker(v):
+            dv = parse(v)
+            if dv < dmin or dv > dmax:
+                raise ValueError(v)
+    else:
+        # compare values of the expected shape as strings
+        match, format_datetime = shape
+        smin, smax = format_datetime(dmin), format_datetime(dmax)
+        def checker(v):
+            if match(v) is None:
+                dv = parse(v)
+                if dv < dmin or dv > dmax:
+                    raise ValueError(v)
+            elif v < smin or v > smax:
+                raise ValueError(v)
+        def batch(values):
+            # values of other shapes may still be valid, so are candidates
+            try:
+                return [j for j, v in enumerate(values)
+                        if match(v) is None or v < smin or v > smax]
+            except TypeError: # some values are not strings
+                return _candidates(values, lambda v: match(v) is None or
+                                   v < smin or v > smax)
+        checker.batch = batch
     return checker
 
 
@@ -1039,13 +4507,56 @@ def datetime_range_exclusive(min, max, format):
 
     dmin = datetime.strptime(min, format)
     dmax = datetime.strptime(max, format)
-    def checker(v):
-        dv = datetime.strptime(v, format)
-        if dv <= dmin or dv >= dmax:
-            raise ValueError(v)
+    parse = _datetime_parser(format)
+    shape = _datetime_shape(format)
+    if shape is None:
+        def checker(v):
+            dv = parse(v)
+            if dv <= dmin or dv >= dmax:
+                raise ValueError(v)
+    else:
+        # compare values of the expected shape as strings
+        match, format_datetime = shape
+        smin, smax = format_datetime(dmin), format_datetime(dmax)
+        def checker(v):
+            if match(v) is None:
+                dv = parse(v)
+                if dv <= dmin or dv >= dmax:
+                    raise ValueError(v)
+            elif v <= smin or v >= smax:
+                raise ValueError(v)
+        def batch(values):
+            # values of other shapes may still be valid, so are candidates
+            try:
+                return [j for j, v in enumerate(values)
+                        if match(v) is None or v <= smin or v >= smax]
+            except TypeError: # some values are not strings
+                return _candidates(values, lambda v: match(v) is None or
+                                   v <= smin or v >= smax)
+        checker.batch = batch
     return checker
 
 
+def _collect_problems(problem_generator, limit=0, stop_on_codes=None):
+    """
+    Return a list of the problems from `problem_generator`, stopping as soon as
+    there are `limit` problems, or a problem has a code in `stop_on_codes`.
+
+    """
+
+    problems = list()
+    try:
+        for p in problem_generator:
+            problems.append(p)
+            if limit and len(problems) >= limit:
+                break
+            if stop_on_codes is not None and p['code'] in stop_on_codes:
+                break
+    finally:
+        problem_generator.close() # stop reading data
+    return problems
+
+
 def write_problems(problems, file, summarize=False, limit=0):
     """
     Write problems as restructured text to a file (or stdout/stderr).
@@ -1081,11 +4592,11 @@ Problems
                 underline += '-'
             underline += '\n'
             w(underline)
-            for k in sorted(p.viewkeys() - set(['code', 'message', 'context'])):
+            for k in sorted(set(p.keys()) - set(['code', 'message', 'context'])):
                 w(':%s: %s\n' % (k, p[k]))
             if 'context' in p:
                 c = p['context']
-                for k in sorted(c.viewkeys()):
+                for k in sorted(c):
                     w(':%s: %s\n' % (k, c[k]))
 
     w("""
@@ -1095,7 +4606,15 @@ Summary
 Found %s%s problem%s in total.
 
 """ % ('at least ' if limit else '', total, 's' if total != 1 else ''))
-    for code in sorted(counts.viewkeys()):
+    # codes may be numbers or strings, so sort numbers first as on Python 2
+    for code in sorted(counts,
+                       key=lambda code: (isinstance(code, basestring), code)):
         w(':%s: %s\n' % (code, counts[code]))
     return total
 
+
+if sys.version_info >= (3, 6):
+    # asynchronous validation requires Python 3 syntax
+    from _csvvalidator_async import aivalidate
+    CSVValidator.aivalidate = aivalidate
+    del aivalidate
@@ -10,7 +10,6 @@ complete account of all features available, see the tests.py module.
 import argparse
 import os
 import sys
-import csv
 from csvvalidator import CSVValidator, enumeration, number_range_inclusive,\
     write_problems, datetime_string, RecordError
 
@@ -94,34 +93,30 @@ def main():
         print '%s is not a file' % args.file
         sys.exit(1)
 
-    with open(args.file, 'r') as f:
+    # create a validator
+    validator = create_validator()
 
-        # set up a csv reader for the data
-        data = csv.reader(f, delimiter='\t')
-        
-        # create a validator
-        validator = create_validator()
-        
-        # validate the data from the csv reader
-        # N.B., validate() returns a list of problems;
-        # if you expect a large number of problems, use ivalidate() instead
-        # of validate(), but bear in mind that ivalidate() returns an iterator
-        # so there is no len()
-        problems = validator.validate(data, 
-                                      summarize=args.summarize,
-                                      report_unexpected_exceptions=args.report_unexpected_exceptions,
-                                      context={'file': args.file})
+    # validate the file, which is read as by a csv reader
+    # N.B., validate_file() returns a list of problems;
+    # if you expect a large number of problems, use ivalidate() instead
+    # with a csv reader for the data, but bear in mind that ivalidate()
+    # returns an iterator so there is no len()
+    problems = validator.validate_file(args.file,
+                                       delimiter='\t',
+                                       summarize=args.summarize,
+                                       report_unexpected_exceptions=args.report_unexpected_exceptions,
+                                       context={'file': args.file})
 
-        # write problems to stdout as restructured text
-        write_problems(problems, sys.stdout, 
-                       summarize=args.summarize, 
-                       limit=args.limit)
-        
-        # decide how to exit
-        if problems: # will not work with ivalidate() because it returns an iterator
-            sys.exit(1)
-        else:
-            sys.exit(0)
+    # write problems to stdout as restructured text
+    write_problems(problems, sys.stdout, 
+                   summarize=args.summarize, 
+                   limit=args.limit)
+    
+    # decide how to exit
+    if problems: # will not work with ivalidate() because it returns an iterator
+        sys.exit(1)
+    else:
+        sys.exit(0)
     
 
 if __name__ == "__main__":
@@ -1,14 +1,21 @@
 #!/usr/bin/env python
 
+import sys
 from distutils.core import setup
 
+
+py_modules = ['csvvalidator']
+if sys.version_info >= (3, 6):
+    # asynchronous validation uses syntax which earlier versions cannot compile
+    py_modules.append('_csvvalidator_async')
+
 setup(name='csvvalidator',
       version='1.3-SNAPSHOT',
       author='Alistair Miles',
       author_email='alimanfoo@googlemail.com',
       url='https://github.com/alimanfoo/csvvalidator',
       license='MIT License',
-      py_modules=['csvvalidator'],
+      py_modules=py_modules,
       description='A simple library for validating data contained in CSV files or similar row-oriented data sources.',
       long_description=open('README.txt').read(),
       classifiers=['Intended Audience :: Developers',
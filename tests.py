@@ -4,8 +4,14 @@ Tests for the `csvvalidator` module.
 """
 
 
+import csv
+import json
 import logging
 import math
+import os
+import sys
+import tempfile
+import time
 
 from csvvalidator import CSVValidator, VALUE_CHECK_FAILED, MESSAGES,\
     HEADER_CHECK_FAILED, RECORD_LENGTH_CHECK_FAILED, enumeration, match_pattern,\
@@ -13,7 +19,7 @@ from csvvalidator import CSVValidator, VALUE_CHECK_FAILED, MESSAGES,\
     VALUE_PREDICATE_FALSE, RECORD_PREDICATE_FALSE, UNIQUE_CHECK_FAILED,\
     ASSERT_CHECK_FAILED, UNEXPECTED_EXCEPTION, write_problems, datetime_string,\
     RECORD_CHECK_FAILED, datetime_range_inclusive, datetime_range_exclusive,\
-    RecordError
+    RecordError, Problem, Profile, depends_on
 
 
 # logging setup
@@ -1044,6 +1050,16 @@ Found 2 problems in total.
     write_problems(problems, file)
     assert file.content == expectation, file.content
 
+    # functions without names, e.g., partial functions, are described too
+    from functools import partial
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_record_check(partial(lambda field, r: int(r[field]), 'bar'))
+    problems = validator.validate([('foo', 'bar'), ('1', 'x')])
+    assert problems[0]['function'].startswith('partial: '), problems
+    file = MockFile()
+    write_problems(problems, file)
+    assert ':function: partial: ' in file.content, file.content
+
 
 def test_write_problems_summarize():
     """Test writing a problem summary as restructured text."""
@@ -1203,3 +1219,1188 @@ def test_guard_conditions():
         assert False, 'expected exception'
 
 
+def test_compile():
+    """Test compilation of checks into a validation plan."""
+
+    field_names = ('foo', 'bar')
+    validator = CSVValidator(field_names)
+    validator.add_value_check('bar', int)
+    validator.add_value_check('foo', int, 'X1', modulus=2)
+
+    plan = validator.compile()
+    assert validator.compile() is plan # plan is cached
+    try:
+        plan.value_checks = None
+    except AttributeError:
+        pass # expected
+    else:
+        assert False, 'expected exception'
+
+    data = (
+            ('foo', 'bar'),
+            ('a', 'b'), # row 2, foo not checked
+            ('a', 'b'), # row 3, both checked
+            ('a', 'b'), # row 4, foo not checked
+            )
+
+    problems = validator.validate(data)
+    assert [(p['row'], p['code']) for p in problems] == [
+        (2, VALUE_CHECK_FAILED),
+        (3, VALUE_CHECK_FAILED),
+        (3, 'X1'),
+        (4, VALUE_CHECK_FAILED)
+        ], problems
+
+    # adding a check discards the plan
+    validator.add_record_length_check()
+    assert validator.compile() is not plan
+    problems = validator.validate(data + (('1', '2', '3'),))
+    assert len(problems) == 5, problems
+    assert problems[-1]['code'] == RECORD_LENGTH_CHECK_FAILED
+
+
+def test_refresh_methods():
+    """Test discovery of methods added after a validator has been used."""
+
+    class MyValidator(CSVValidator):
+
+        def __init__(self):
+            super(MyValidator, self).__init__(('foo', 'bar'))
+
+        def check_foo(self, r):
+            if r['foo'] != 'A':
+                raise RecordError('X1')
+
+    data = (
+            ('foo', 'bar'),
+            ('B', '1'),
+            )
+
+    validator = MyValidator()
+    problems = validator.validate(data)
+    assert [p['code'] for p in problems] == ['X1'], problems
+
+    def check_bar(self, r):
+        if r['bar'] != '2':
+            raise RecordError('X2')
+    MyValidator.check_bar = check_bar
+
+    # methods are discovered once per class
+    problems = validator.validate(data)
+    assert [p['code'] for p in problems] == ['X1'], problems
+    problems = MyValidator().validate(data)
+    assert [p['code'] for p in problems] == ['X1'], problems
+
+    validator.refresh_methods()
+    problems = validator.validate(data)
+    assert [p['code'] for p in problems] == ['X2', 'X1'], problems
+
+
+def test_record_view():
+    """Test records are passed to record level functions as a shared view."""
+
+    field_names = ('foo', 'bar')
+    validator = CSVValidator(field_names)
+
+    seen = []
+    def mutating_check(r):
+        seen.append(r)
+        r['foo'] = 'changed'
+        del r['bar']
+        assert r == {'foo': 'changed'}, r
+        assert r.copy() == {'foo': 'changed'}
+    validator.add_record_check(mutating_check)
+
+    def other_check(r):
+        seen.append(r)
+        if r != {'foo': '1', 'bar': None}:
+            raise RecordError('X1', details=dict(r))
+        copied = r.copy()
+        assert type(copied) is dict and copied == r
+        assert json.loads(json.dumps(copied)) == copied
+    validator.add_record_check(other_check)
+
+    data = (
+            ('foo', 'bar'),
+            ('1',) # missing value for bar
+            )
+
+    problems = validator.validate(data)
+    assert len(problems) == 0, problems
+    assert seen[0] is seen[1] # a single view per record
+    assert data[1] == ('1',) # record is not modified
+
+
+def test_validate_columns():
+    """Test validation of batches of rows a column at a time."""
+
+    field_names = ('foo', 'bar', 'baz')
+
+    def batch_is_upper(values):
+        return [j for j, v in enumerate(values) if not v.isupper()]
+    def is_upper(v):
+        if not v.isupper():
+            raise ValueError(v)
+    is_upper.batch = batch_is_upper
+
+    def skip_pragma(record):
+        return record[0].startswith('#')
+
+    data = (
+            ('foo', 'bar', 'baz'),
+            ('1', '2.0', 'A'),
+            ('x', 'y', 'b'),
+            ('# a pragma', 'y', 'b'),
+            ('3', 'y'),
+            ('x', 'y', 'BB'),
+            ('5', '6', 'C', 'D'),
+            ('7', 'y', 'd')
+            )
+
+    # with only value checks, value predicates, header checks and record
+    # length checks, rows are not otherwise validated one at a time
+    for skip, n in ((True, 9), (False, 11)):
+        validator = CSVValidator(field_names)
+        validator.add_header_check()
+        validator.add_record_length_check()
+        validator.add_value_check('foo', int)
+        validator.add_value_check('bar', float, 'X1', modulus=2)
+        validator.add_value_check('baz', is_upper, 'X2')
+        validator.add_value_predicate('baz', lambda v: len(v) == 1, 'X3')
+        if skip:
+            validator.add_skip(skip_pragma)
+
+        expectation = validator.validate(data)
+        assert len(expectation) == n, expectation
+        summary = validator.validate(data, summarize=True)
+        for batch_size in (1, 3, 100):
+            problems = validator.validate_columns(data, batch_size=batch_size)
+            assert problems == expectation, (batch_size, problems)
+            problems = validator.validate_columns(data, batch_size=batch_size,
+                                                  summarize=True)
+            assert problems == summary, (batch_size, problems)
+
+
+def test_batch_checks():
+    """Test the batch attribute of the value check function factories."""
+
+    checks = [
+              enumeration('M', 'F'),
+              enumeration(['M', 'F']),
+              match_pattern('^[A-Z]+$'),
+              search_pattern('[0-9]'),
+              number_range_inclusive(1, 10),
+              number_range_inclusive(1, 10, int),
+              number_range_exclusive(1, 10),
+              number_range_exclusive(1, 10, int),
+              datetime_string('%Y-%m-%d'),
+              datetime_string('%Y-%m-%dT%H:%M:%S'),
+              datetime_string('%d/%m/%Y'),
+              datetime_range_inclusive('2011-01-01', '2011-12-31', '%Y-%m-%d'),
+              datetime_range_exclusive('2011-01-01', '2011-12-31', '%Y-%m-%d')
+              ]
+    values = ['M', 'F', 'X', '', 'M\x00', '1', '10', '1.5', 'nan', ' 7 ', 'ABC',
+              '2011-01-01', '2011-12-31', '2011-06-15', '2011-6-15', '2012-01-01',
+              '2011-02-29', '0000-01-01', '2011-01-01\n', '2011-01-01T12:30:00',
+              '15/06/2011']
+    valid_values = ['M', 'M', 'ABC', '7', '5', '5', '5', '5', '2011-03-03',
+                    '2011-03-03T12:30:00', '03/03/2011', '2011-03-03',
+                    '2011-03-03']
+
+    for check, valid in zip(checks, valid_values):
+        # only the positions of invalid values are reported by batch, even if
+        # some values can't be checked as a batch
+        for bad in ('?', None, 2**100):
+            column = [valid] * 5 + [bad] + [valid] * 5
+            batch = getattr(check, 'batch', None)
+            assert batch is None or list(batch(column)) == [5], (check, bad)
+
+        expectation = list()
+        for j, v in enumerate(values):
+            try:
+                check(v)
+            except Exception:
+                expectation.append(j)
+        batch = getattr(check, 'batch', None)
+        if batch is not None:
+            # batch may report false positives, never false negatives
+            candidates = batch(values)
+            assert set(expectation) <= set(candidates), (values, candidates)
+
+        validator = CSVValidator(('foo',))
+        validator.add_value_check('foo', check)
+        data = [('foo',)] + [(v,) for v in values] + [('2011-03-03',)] * 10
+        expectation = validator.validate(data)
+        problems = validator.validate_columns(data, batch_size=7)
+        assert len(problems) == len(expectation), (problems, expectation)
+        for p, e in zip(problems, expectation):
+            # exceptions are compared by identity
+            assert p.pop('exception', None).__class__ == \
+                e.pop('exception', None).__class__
+            assert p == e, (p, e)
+
+
+def test_validate_parallel():
+    """Test validation of a CSV file using multiple processes."""
+
+    class MyValidator(CSVValidator):
+
+        def __init__(self):
+            super(MyValidator, self).__init__(('foo', 'bar'))
+            self.add_header_check()
+            self.add_value_check('foo', int)
+            self.add_value_check('bar', int, 'X1', modulus=3)
+            self.add_unique_check('bar')
+            self._count = 0
+
+        def each_count(self, r):
+            self._count += 1
+
+        def get_shard_state(self):
+            return self._count
+
+        def merge_shard_state(self, state):
+            self._count += state
+
+        def finally_assert_count(self):
+            assert self._count == 100, ('X2', self._count)
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('foo,baz\n')
+            for i in range(100):
+                f.write('%s,%s\n' % (i if i % 7 else 'x', i % 40 if i % 11 else 'y'))
+
+        with open(path, 'rb' if sys.version_info[0] == 2 else 'r') as f:
+            expectation = MyValidator().validate(csv.reader(f))
+        assert len(expectation) > 50, expectation
+        assert not [p for p in expectation if p['code'] == 'X2']
+
+        problems = MyValidator().validate_parallel(path, workers=2, shards=5)
+        assert len(problems) == len(expectation), problems
+        assert [p['row'] for p in problems] == [p['row'] for p in expectation]
+        # unique check problems may be reported later within a row
+        key = lambda p: (p['row'], str(p['code']))
+        assert sorted(problems, key=key) == sorted(expectation, key=key)
+
+        problems = MyValidator().validate_parallel(path, workers=2, limit=3)
+        assert problems == expectation[:3], problems
+
+        # records are only read again for duplicates if problems keep them
+        import csvvalidator
+        read_records = csvvalidator._read_records
+        calls = list()
+        def counted(*args):
+            calls.append(args)
+            return read_records(*args)
+        csvvalidator._read_records = counted
+        try:
+            MyValidator().validate_parallel(path, workers=2, shards=5,
+                                            summarize=True)
+            MyValidator().validate_parallel(path, workers=2, shards=5,
+                                            record_policy='none')
+            assert not calls, calls
+            problems = MyValidator().validate_parallel(path, workers=2,
+                                                       shards=5)
+            assert 0 < len(calls) <= 5, calls
+        finally:
+            csvvalidator._read_records = read_records
+        assert sorted(problems, key=key) == sorted(expectation, key=key)
+
+        # quoted values with line breaks, and quotes in unquoted values
+        with open(path, 'w') as f:
+            f.write('foo,baz\n')
+            for i in range(100):
+                foo = '"%s\n%s"' % (i, i) if i % 9 == 0 else i
+                bar = '%s"' % i if i % 13 == 0 else i % 40
+                f.write('%s,%s\n' % (foo, bar))
+
+        with open(path, 'rb' if sys.version_info[0] == 2 else 'r') as f:
+            expectation = MyValidator().validate(csv.reader(f))
+        assert len(expectation) > 20, expectation
+        for shards in range(1, 12):
+            problems = MyValidator().validate_parallel(path, workers=2,
+                                                       shards=shards)
+            assert sorted(problems, key=key) == sorted(expectation, key=key), \
+                shards
+
+        # the last record has a line break in a quoted value, and continues
+        # past the start of the last shard
+        with open(path, 'w') as f:
+            f.write('a,b,c\n22,"q,\n",x,x\n')
+        validator = CSVValidator(('a', 'b', 'c'))
+        validator.add_header_check()
+        validator.add_record_length_check()
+        validator.add_value_check('a', int)
+        expectation = validator.validate_file(path)
+        assert len(expectation) == 1, expectation
+        problems = validator.validate_parallel(path, workers=2, shards=2)
+        assert [dict((k, p[k]) for k in p if k != 'offset')
+                for p in problems] == \
+            [dict((k, p[k]) for k in p if k != 'offset') for p in expectation]
+    finally:
+        os.remove(path)
+
+    from csvvalidator import _count_records
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'a,b\n"c\nd",e\nf,g\n')
+        assert _count_records(path, 0, 100) == (3, False)
+        assert _count_records(path, 0, 5) == (2, True)
+        assert _count_records(path, 0, 4) == (1, False)
+        assert _count_records(path, 9, 100) == (1, False)
+        assert _count_records(path, 13, 100) == (0, False)
+        with open(path, 'wb') as f:
+            f.write(b'a,b\n"c\nd",e\n')
+        assert _count_records(path, 0, 7) == (2, True)
+        assert _count_records(path, 0, 100) == (2, False)
+        with open(path, 'wb') as f:
+            f.write(b'a,b\n\nc,d')
+        assert _count_records(path, 0, 100) == (3, False)
+        assert _count_records(path, 1, 100) == (2, False)
+        assert _count_records(path, 0, 4) == (1, False)
+    finally:
+        os.remove(path)
+
+
+def test_executor():
+    """Test applying record checks and record predicates with an executor."""
+
+    from multiprocessing.pool import ThreadPool
+
+    class Future(object):
+
+        def __init__(self, result):
+            self._result = result
+
+        def result(self):
+            return self._result.get()
+
+        def done(self):
+            return self._result.ready()
+
+        def cancel(self):
+            return False
+
+    class Executor(object):
+
+        def __init__(self):
+            self.pool = ThreadPool(4)
+            self.submitted = 0
+
+        def submit(self, fn, *args):
+            self.submitted += 1
+            return Future(self.pool.apply_async(fn, args))
+
+    def check_foo(r):
+        if int(r['foo']) % 3 == 0:
+            raise RecordError('X1', 'foo is a multiple of 3')
+
+    def bar_is_even(r):
+        r['bar'] = 'changed' # changes must not be seen by other functions
+        return int(r['foo']) % 2 == 0
+
+    def check_bar(r):
+        if r['bar'] == 'changed':
+            raise RecordError('X3')
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_value_check('foo', int)
+    validator.add_record_check(check_foo)
+    validator.add_record_predicate(bar_is_even, 'X2', modulus=2)
+    validator.add_record_check(check_bar)
+    validator.add_unique_check('bar')
+
+    data = [('foo', 'bar')]
+    data.extend((str(i) if i % 7 else 'x', i % 5) for i in range(50))
+    expectation = validator.validate(data)
+    assert len(expectation) > 30, expectation
+    assert not [p for p in expectation if p['code'] == 'X3']
+
+    # exceptions are raised anew, so compare their types
+    def key(p):
+        p = dict(p)
+        if 'exception' in p: p['exception'] = type(p['exception'])
+        return p
+    expectation = [key(p) for p in expectation]
+
+    executor = Executor()
+    for window in 1, 2, 1000:
+        problems = validator.validate(data, executor=executor, window=window)
+        assert [key(p) for p in problems] == expectation, (window, problems)
+    assert executor.submitted == 3 * (25 + 50 + 50)
+
+
+def test_unique_checks_fingerprint():
+    """Test unique checks keeping only fingerprints of keys."""
+
+    import csvvalidator
+
+    data = [('foo', 'bar')]
+    data.extend((str(i % 1500), str(i % 7)) for i in range(3000))
+
+    def make_validator(**kwargs):
+        validator = CSVValidator(('foo', 'bar'))
+        validator.add_unique_check('foo', 'X1', **kwargs)
+        validator.add_unique_check(('foo', 'bar'), 'X2', **kwargs)
+        return validator
+
+    expectation = make_validator().validate(data)
+    assert len(expectation) == 1500, len(expectation)
+    for bits in 64, 128:
+        validator = make_validator(fingerprint=bits)
+        assert validator.validate(data) == expectation
+        assert validator.validate(iter(data)) == expectation
+
+    # make all keys have the same fingerprint, which is slow but shows that
+    # candidate duplicates are confirmed if data is a sequence or a file
+    fingerprint = csvvalidator._fingerprint
+    csvvalidator._fingerprint = lambda value, width: fingerprint(0, width)
+    try:
+        validator = make_validator(fingerprint=64)
+        assert validator.validate(data[:100]) == []
+        problems = validator.validate(iter(data[:100]))
+        assert len(problems) == 2 * 98, len(problems)
+        problems = make_validator(fingerprint=64,
+                                  confirm=False).validate(data[:100])
+        assert len(problems) == 2 * 98, len(problems)
+
+        # candidate duplicates are confirmed by offset if data is a file
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for r in data[:100]:
+                    f.write('%s,%s\n' % r)
+            assert validator.validate_file(path) == []
+            assert validator.validate_parallel(path, workers=2, shards=3) == []
+            problems = make_validator(fingerprint=64,
+                                      confirm=False).validate_file(path)
+            assert len(problems) == 2 * 98, len(problems)
+        finally:
+            os.remove(path)
+    finally:
+        csvvalidator._fingerprint = fingerprint
+
+
+def test_unique_checks_max_keys():
+    """Test unique checks keeping at most a given number of keys in memory."""
+
+    data = [('foo', 'bar')]
+    data.extend((str(i % 15), str(i % 7)) for i in range(100))
+
+    def make_validator(**kwargs):
+        validator = CSVValidator(('foo', 'bar'))
+        validator.add_value_check('bar', int)
+        validator.add_unique_check('foo', 'X1', **kwargs)
+        validator.add_unique_check(('foo', 'bar'), 'X2', **kwargs)
+        return validator
+
+    expectation = make_validator().validate(data)
+    assert len(expectation) > 80, len(expectation)
+    key = lambda p: (p['code'], p['row'])
+
+    for max_keys in 1, 4, 10, 1000:
+        validator = make_validator(max_keys=max_keys)
+        problems = validator.validate(data)
+        assert sorted(problems, key=key) == sorted(expectation, key=key), \
+            max_keys
+        problems = validator.validate(iter(data))
+        assert sorted(map(key, problems)) == sorted(map(key, expectation))
+
+    # duplicates of keys no longer in memory are reported last, by key
+    problems = make_validator(max_keys=10).validate(data[:21])
+    assert [key(p) for p in problems] == [('X1', 17), ('X1', 18), ('X1', 19),
+                                          ('X1', 20), ('X1', 21)], problems
+    assert problems[0]['value'] == '0'
+    assert problems[0]['record'] == ('0', '1')
+
+    # many runs of keys are written to a single temporary file per check
+    import tempfile
+    opened = list()
+    TemporaryFile = tempfile.TemporaryFile
+    def temporary_file(*args, **kwargs):
+        f = TemporaryFile(*args, **kwargs)
+        opened.append(f)
+        return f
+    data = [('foo', 'bar')]
+    data.extend((str(i % 3000), '0') for i in range(6000))
+    tempfile.TemporaryFile = temporary_file
+    try:
+        problems = make_validator(max_keys=2).validate(data)
+    finally:
+        tempfile.TemporaryFile = TemporaryFile
+    assert len(problems) == 6000, len(problems)
+    assert len(opened) == 2, len(opened)
+    assert all(f.closed for f in opened)
+
+
+def test_unique_checks_bloom():
+    """Test unique checks with a Bloom filter."""
+
+    data = [('foo', 'bar')]
+    data.extend((str(i % 150), str(i % 7)) for i in range(1000))
+
+    def make_validator(**kwargs):
+        validator = CSVValidator(('foo', 'bar'))
+        validator.add_unique_check('foo', 'X1', **kwargs)
+        validator.add_unique_check(('foo', 'bar'), 'X2', **kwargs)
+        return validator
+
+    expectation = make_validator().validate(data)
+    assert len(expectation) > 800, len(expectation)
+    key = lambda p: (p['code'], p['row'])
+
+    # a filter much too small for the number of keys finds the same problems
+    for bloom in 10, 1000:
+        for kwargs in {}, {'fingerprint': 64}, {'max_keys': 100}:
+            validator = make_validator(bloom=bloom, **kwargs)
+            problems = validator.validate(data)
+            assert sorted(problems, key=key) == sorted(expectation, key=key), \
+                (bloom, kwargs)
+
+    # no duplicates of keys no longer in memory
+    unique = [('foo', 'bar')] + [(str(i), '') for i in range(1000)]
+    validator = make_validator(bloom=1000, max_keys=100)
+    assert validator.validate(unique) == []
+
+
+def test_early_termination():
+    """Test that validation stops reading data once it stops reporting."""
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_header_check()
+    validator.add_value_check('foo', int)
+    validator.add_record_length_check('X1')
+
+    read = [0]
+    def data():
+        yield ('foo', 'baz')
+        for i in range(1000):
+            read[0] += 1
+            yield (str(i) if i % 10 else 'x', 'y') if i != 55 else ('0',)
+
+    problems = validator.validate(data(), limit=3)
+    assert [p['code'] for p in problems] == [HEADER_CHECK_FAILED,
+                                             VALUE_CHECK_FAILED,
+                                             VALUE_CHECK_FAILED]
+    assert read[0] == 11, read[0]
+
+    read[0] = 0
+    problems = validator.validate(data(), fail_fast=True)
+    assert [p['code'] for p in problems] == [HEADER_CHECK_FAILED]
+    assert read[0] == 0, read[0]
+
+    for validate in validator.validate, validator.validate_columns:
+        read[0] = 0
+        problems = validate(data(), stop_on_codes=set(['X1']))
+        assert len(problems) == 8, problems
+        assert problems[-1]['code'] == 'X1'
+        assert problems[-1]['row'] == 57
+        assert read[0] == (56 if validate == validator.validate else 1000)
+
+
+def test_summarize_counts():
+    """Test counting problems without reporting them."""
+
+    from collections import Counter
+
+    class MyValidator(CSVValidator):
+
+        def __init__(self):
+            super(MyValidator, self).__init__(('foo', 'bar', 'baz'))
+            self.add_header_check()
+            self.add_record_length_check()
+            self.add_value_check('foo', int, 'X1')
+            self.add_value_check('bar', float, 'X2', modulus=2)
+            self.add_value_predicate('baz', lambda v: v != 'q', 'X3')
+            self.add_record_check(self.record_check)
+            self.add_record_predicate(lambda r: r['foo'] != r['bar'], 'X4')
+            self.add_unique_check('baz', 'X5')
+            self.add_unique_check(('foo', 'bar'), 'X6', max_keys=3)
+            self.add_skip(lambda r: r[0] == 'skip')
+
+        def record_check(self, r):
+            if r['baz'] == 'e':
+                raise RecordError('X7')
+            int(r['bar'])
+
+        def each_fail(self, r):
+            if r['baz'] == 'f':
+                raise ValueError('oops')
+
+        def check_baz(self, r):
+            if r['baz'] == 'g':
+                raise RecordError()
+
+        def assert_foo(self, r):
+            assert r['foo'] != '7', 'X8'
+
+        def finally_assert_done(self):
+            assert False, ('X9', 'done')
+
+    data = [('foo', 'bar')]
+    for i in range(60):
+        data.append((str(i % 13) if i % 11 else 'x',
+                     str(i % 5) if i % 9 else 'z', 'abcdefgq'[i % 8]))
+    data.extend([('1', '1'), ('skip',), ('1', '1', 'a', 'b')])
+
+    validator = MyValidator()
+    problems = validator.validate(data)
+    expectation = Counter(p['code'] for p in problems)
+    assert len(expectation) == 13, expectation
+    assert validator.summarize(data) == expectation
+    assert validator.summarize(iter(data)) == expectation
+    assert validator.summarize(data, report_unexpected_exceptions=False) == \
+        Counter(p['code'] for p in problems if p['code'] != UNEXPECTED_EXCEPTION)
+
+    counts = validator.summarize(data, by_field=True)
+    assert sum(counts.values()) == len(problems)
+    assert counts[('X1', 'foo')] == expectation['X1']
+    assert counts[('X5', None)] == expectation['X5']
+    counts = validator.summarize(data, by_check=True)
+    assert counts[(UNEXPECTED_EXCEPTION, validator.record_check)] == \
+        len([p for p in problems if p.get('function', '').startswith('record_check')])
+    assert counts[('X6', ('foo', 'bar'))] == expectation['X6']
+    counts = validator.summarize(data, by_field=True, by_check=True)
+    assert counts[('X2', 'bar', float)] == expectation['X2']
+
+    # problems are counted under the checks as added, and compound keys given
+    # as lists are counted as tuples
+    digits = match_pattern('[0-9]+$')
+    short = match_pattern('.?$')
+    def check_int(v):
+        int(v)
+    validator = CSVValidator(('foo', 'bar', 'baz'))
+    validator.add_value_check('foo', digits, 'X1')
+    validator.add_value_check('foo', short, 'X2')
+    validator.add_value_check('bar', check_int, 'X3', memoize=True)
+    validator.add_unique_check(['foo', 'bar'], 'X4')
+    data = [('foo', 'bar', 'baz'), ('1', '2', 'a'), ('x', 'z', 'b'),
+            ('12', '2', 'c'), ('1', '2', 'd')]
+    counts = validator.summarize(data, by_check=True)
+    assert counts == Counter({('X1', digits): 1, ('X2', short): 1,
+                              ('X3', check_int): 1,
+                              ('X4', ('foo', 'bar')): 1}), counts
+
+
+def test_problem():
+    """Test problems can be used as dictionaries."""
+
+    import pickle
+
+    def check(r):
+        """Check bar."""
+        int(r['bar'])
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_value_check('foo', int)
+    validator.add_record_check(check)
+    problems = validator.validate([('foo', 'bar'), ('1', 'x'), ('y', '2')])
+    assert len(problems) == 2, problems
+
+    p = problems[0]
+    assert isinstance(p, Problem)
+    assert p['code'] == p.code == UNEXPECTED_EXCEPTION
+    assert p['message'] == MESSAGES[UNEXPECTED_EXCEPTION] % ('ValueError',
+                                                              p['exception'])
+    assert p['function'] == 'check: Check bar.'
+    assert set(p) == set(['code', 'message', 'row', 'record', 'exception',
+                          'function'])
+    assert 'column' not in p and p.get('column') is None
+    assert len(p) == 6
+    d = dict(p)
+    assert p == d and d == p
+    q = pickle.loads(pickle.dumps(p, 2))
+    assert set(q) == set(p) and q['function'] == p['function']
+
+    p = problems[1]
+    assert p == {'code': VALUE_CHECK_FAILED,
+                 'message': MESSAGES[VALUE_CHECK_FAILED], 'row': 3,
+                 'column': 1, 'field': 'foo', 'value': 'y',
+                 'record': ('y', '2')}
+    p['note'] = 'extra'
+    p['message'] = 'custom'
+    del p['record']
+    assert p['note'] == 'extra' and p.message == 'custom'
+    assert 'record' not in p and 'note' in p
+    try:
+        p['other']
+    except KeyError:
+        pass
+    else:
+        assert False, 'expected KeyError'
+
+    problems = validator.validate([('foo', 'bar'), ('y', 'x')], summarize=True)
+    assert [dict(p) for p in problems] == [{'code': VALUE_CHECK_FAILED},
+                                           {'code': UNEXPECTED_EXCEPTION}]
+
+
+def test_record_policy():
+    """Test the policies for keeping records in problems."""
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_value_check('foo', int)
+
+    def reused():
+        # a source which reuses the same list for every record
+        r = list()
+        for foo, bar in (('foo', 'bar'), ('x', '1'), ('2', '2'), ('y', '3')):
+            r[:] = [foo, bar]
+            yield r
+
+    problems = validator.validate(reused())
+    assert [p['record'] for p in problems] == [['y', '3'], ['y', '3']]
+    problems = validator.validate(reused(), record_policy='copy')
+    assert [p['record'] for p in problems] == [['x', '1'], ['y', '3']]
+    problems = validator.validate(reused(), record_policy='none')
+    assert len(problems) == 2 and 'record' not in problems[0]
+    try:
+        validator.validate(reused(), record_policy='offset')
+    except ValueError:
+        pass
+    else:
+        assert False, 'expected ValueError'
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('foo,bar\n')
+            for i in range(20):
+                f.write('%s,%s\n' % (i if i % 3 else 'x', i))
+        expectation = validator.validate_parallel(path, workers=2, shards=3)
+        problems = validator.validate_parallel(path, workers=2, shards=3,
+                                               record_policy='offset')
+        assert len(problems) == 7, problems
+        assert [dict(p) for p in expectation] == [
+            dict((k, p[k]) for k in p if k != 'offset') for p in problems]
+        p = problems[1]
+        assert p['offset'] == len('foo,bar\n0,0\n1,1\n2,2\n')
+        assert p['record'] == ['x', '3'] and 'record' in p
+    finally:
+        os.remove(path)
+
+
+def test_dependencies():
+    """Test record level checks are not applied on values which failed."""
+
+    from collections import Counter
+
+    def check_age(r):
+        if int(r['age_years']) * 12 + int(r['age_months']) > 1500:
+            raise RecordError('X1')
+
+    class MyValidator(CSVValidator):
+
+        def __init__(self):
+            super(MyValidator, self).__init__(('age_years', 'age_months',
+                                               'name'))
+            self.add_value_check('age_years', int)
+            self.add_value_predicate('name', bool, 'X2')
+            self.add_record_check(check_age,
+                                  fields=('age_years', 'age_months'))
+            self.add_record_predicate(lambda r: r['name'] != 'x', 'X3',
+                                      fields='name')
+
+        @depends_on('age_years')
+        def assert_age(self, r):
+            assert int(r['age_years']) >= 0, 'X4'
+
+    data = [('age_years', 'age_months', 'name'),
+            ('200', '0', 'x'),
+            ('-1', '1', 'y'),
+            ('z', '1', ''),
+            ('2', 'w', 'z')]
+    expectation = [(2, 'X1'), (2, 'X3'), (3, 'X4'), (4, VALUE_CHECK_FAILED),
+                   (4, 'X2'), (5, UNEXPECTED_EXCEPTION)]
+    validator = MyValidator()
+    problems = validator.validate(data)
+    assert [(p['row'], p['code']) for p in problems] == expectation, problems
+    problems = validator.validate_columns(data, batch_size=2)
+    assert [(p['row'], p['code']) for p in problems] == expectation, problems
+    counts = validator.summarize(data)
+    assert counts == Counter(code for row, code in expectation), counts
+
+
+def test_adaptive():
+    """Test checks are reordered by their failure rate."""
+
+    def slow_int(v):
+        time.sleep(0.001)
+        int(v)
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_value_check('foo', slow_int, 'X1')
+    validator.add_value_check('bar', int, 'X2')
+    validator.add_record_predicate(lambda r: r['foo'] != '0', 'X3')
+    validator.add_record_predicate(lambda r: r['bar'] != '0', 'X4')
+    data = [('foo', 'bar'), ('1', 'y'), ('2', '0'), ('3', '3'),
+            ('x', 'y'), ('0', '0')]
+
+    problems = validator.validate(data)
+    assert [(p['row'], p['code']) for p in problems] == [
+        (2, 'X2'), (3, 'X4'), (5, 'X1'), (5, 'X2'), (6, 'X3'), (6, 'X4')]
+    # X2 and X4 were found in the first 4 rows, X1 and X3 were not
+    problems = validator.validate(data, adaptive=4)
+    assert [(p['row'], p['code']) for p in problems] == [
+        (2, 'X2'), (3, 'X4'), (5, 'X2'), (5, 'X1'), (6, 'X4'), (6, 'X3')]
+    problems = validator.validate(data, adaptive=100)
+    assert len(problems) == 6
+
+    # checks which fail as often are applied in the order they were added,
+    # however long they take
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_value_check('foo', slow_int, 'X1')
+    validator.add_value_check('bar', int, 'X2')
+    data = [('foo', 'bar'), ('x', 'y'), ('1', '2'), ('x', 'y')]
+    problems = validator.validate(data, adaptive=2)
+    assert [(p['row'], p['code']) for p in problems] == [
+        (2, 'X1'), (2, 'X2'), (4, 'X1'), (4, 'X2')]
+
+
+def test_profile():
+    """Test recording statistics on the calls made to each check."""
+
+    class MyValidator(CSVValidator):
+
+        def __init__(self):
+            super(MyValidator, self).__init__(('foo', 'bar'))
+            self.add_value_check('foo', int)
+            self.add_value_predicate('bar', lambda v: v != 'b')
+            self.add_unique_check('foo')
+            self.add_skip(lambda r: r[0] == 's')
+
+        def check_bar(self, r):
+            if r['bar'].lower() == 'c':
+                raise RecordError
+
+        def finally_assert_ok(self):
+            pass
+
+    data = [('foo', 'bar'), ('1', 'a'), ('x', 'b'), ('1', 'c'), ('s', 'a'),
+            ('2', None)]
+    validator = MyValidator()
+    problems = validator.validate(data, profile=True)
+    assert len(problems) == 5, problems
+    profile = validator.profile
+    assert isinstance(profile, Profile)
+    stats = profile.as_dict()
+    assert set(stats) == set([('skip', '<lambda>'), ('value check', 'foo: int'),
+                              ('value predicate', 'bar: <lambda>'),
+                              ('unique check', 'foo'),
+                              ('check method', 'check_bar'),
+                              ('finally assert method', 'finally_assert_ok')])
+    key = lambda s: (s['calls'], s['failures'], s['exceptions'])
+    assert key(stats[('skip', '<lambda>')]) == (5, 1, 0)
+    assert key(stats[('value check', 'foo: int')]) == (4, 1, 0)
+    assert key(stats[('value predicate', 'bar: <lambda>')]) == (4, 1, 0)
+    assert key(stats[('unique check', 'foo')]) == (4, 1, 0)
+    assert key(stats[('check method', 'check_bar')]) == (4, 1, 1)
+    assert stats[('finally assert method', 'finally_assert_ok')]['calls'] == 1
+    for s in stats.values():
+        assert 0 <= s['max_time'] <= s['time']
+
+    table = profile.as_table()
+    assert table[0] == ('kind', 'name') + Profile.STATISTICS
+    assert [row[0] for row in table[1:]] == [
+        'skip', 'value check', 'value predicate', 'unique check',
+        'check method', 'finally assert method']
+
+    class MockFile(object):
+
+        def __init__(self):
+            self.content = ''
+
+        def write(self, s):
+            self.content += s
+
+    file = MockFile()
+    profile.write(file)
+    assert len(file.content.splitlines()) == 7, file.content
+
+
+def test_memoize():
+    """Test remembering the outcome of value checks and value predicates."""
+
+    calls = []
+
+    def gender(v):
+        calls.append(v)
+        if v not in ('M', 'F'):
+            raise ValueError(v)
+
+    def code(v):
+        calls.append(v)
+        return int(v) < 3
+
+    validator = CSVValidator(('gender', 'code'))
+    validator.add_value_check('gender', gender, memoize=True)
+    validator.add_value_predicate('code', code, memoize=True, cache_size=2)
+    data = [('gender', 'code'), ('M', '1'), ('F', '1'), ('X', '5'), ('M', 'y'),
+            ('X', '5'), ('F', '1'), ('M', 'y')]
+    expectation = CSVValidator(('gender', 'code'))
+    expectation.add_value_check('gender', gender)
+    expectation.add_value_predicate('code', code)
+    expected = expectation.validate(data)
+    del calls[:]
+
+    problems = validator.validate(data)
+    assert len(problems) == len(expected) == 6
+    for p, e in zip(problems, expected):
+        assert set(p) == set(e)
+        assert p['row'] == e['row'] and p['code'] == e['code']
+        assert p.get('function') == e.get('function')
+        assert type(p.get('exception')) == type(e.get('exception'))
+    # gender values are all remembered, only the last 2 codes are
+    assert sorted(calls) == sorted(['M', 'F', 'X', '1', '5', 'y', '1', 'y'])
+    assert validator.cache_info() == [('gender', gender, 4, 3, 3),
+                                      ('code', code, 2, 5, 2)]
+
+
+def test_datetime_parser():
+    """Test datetime checks accept and reject the same values as strptime."""
+
+    from datetime import datetime
+    from csvvalidator import _datetime_parser
+
+    values = ['2020-02-29', '2019-02-29', '2020-2-9', '2020-02- 9', '0000-01-01',
+              '2020-13-01', '2020-00-10', '2020-01-32', '20-01-01', ' 2020-01-01',
+              '2020-01-01 ', '2020-01-01T23:59:59', '2020-01-01t00:00:00',
+              '2020-01-01 23:59:60', '2020-01-01  1:2:3', '2020-01-01\t01:02:03',
+              '2020-01-01T24:00:00', '01/02/2020', '31/04/2020', '2020/01/01',
+              '20200101', '20201301', '']
+    formats = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+               '%d/%m/%Y', '%Y%m%d', '%Y-%m-%d %H:%M:%S.%f', '%b %Y']
+    for format in formats:
+        parse = _datetime_parser(format)
+        for v in values:
+            try:
+                expectation = datetime.strptime(v, format)
+            except ValueError:
+                expectation = ValueError
+            try:
+                result = parse(v)
+            except ValueError:
+                result = ValueError
+            assert result == expectation, (format, v, result, expectation)
+
+
+def test_datetime_range_strings():
+    """Test datetime range checks which compare values as strings."""
+
+    from csvvalidator import _datetime_shape
+
+    assert _datetime_shape('%Y-%m-%d') is not None
+    assert _datetime_shape('%Y%m%d %H:%M') is not None
+    assert _datetime_shape('%d/%m/%Y') is None
+    assert _datetime_shape('%Y-%m-%d %M') is None
+
+    inclusive = datetime_range_inclusive('2019-12-31', '2020-02-29',
+                                         '%Y-%m-%d')
+    exclusive = datetime_range_exclusive('2019-12-31', '2020-02-29',
+                                         '%Y-%m-%d')
+    for v, valid_inclusive, valid_exclusive in (
+            ('2019-12-30', False, False),
+            ('2019-12-31', True, False),
+            ('2020-1-1', True, True), # not zero padded, so parsed
+            ('2020-01-15', True, True),
+            ('2020-02-28', True, True),
+            ('2020-02-29', True, False),
+            ('2020-02-30', False, False), # not a date
+            ('2020-03-01', False, False),
+            ('2020-01-15 ', False, False),
+            ('2020-0a-15', False, False)):
+        for check, valid in ((inclusive, valid_inclusive),
+                             (exclusive, valid_exclusive)):
+            try:
+                check(v)
+            except ValueError:
+                assert not valid, v
+            else:
+                assert valid, v
+
+
+def test_enumeration_from_file():
+    """Test enumerations of members listed in a file."""
+
+    from csvvalidator import enumeration_from_file
+
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('A01\n B02 \n\nc03\r\nD04\n')
+        for options, valid, invalid in (
+                ({}, ['A01', ' B02 ', 'c03', 'D04'],
+                 ['a01', 'B02', '', 'E05']),
+                ({'strip': True}, ['A01', 'B02', ' B02', 'c03'],
+                 ['C03', '']),
+                ({'ignore_case': True}, ['a01', ' b02 ', 'C03'],
+                 ['B02']),
+                ({'strip': True, 'ignore_case': True}, ['a01 ', 'b02', 'C03'],
+                 ['E05'])):
+            for compact in (False, True):
+                check = enumeration_from_file(path, compact=compact, **options)
+                for v in valid:
+                    check(v)
+                for v in invalid:
+                    try:
+                        check(v)
+                    except ValueError:
+                        pass
+                    else:
+                        assert False, (options, compact, v)
+    finally:
+        os.remove(path)
+
+    from csvvalidator import _SortedMembers
+    members = _SortedMembers(['b', 'a', 'c', 'a', ''])
+    assert len(members) == 4 and list(members) == ['', 'a', 'b', 'c']
+    for m in '', 'a', 'b', 'c':
+        assert m in members
+    for m in 'aa', 'd', ' ', None:
+        assert m not in members
+
+
+def test_fused_patterns():
+    """Test several match_pattern checks on the same field."""
+
+    field_names = ('foo', 'bar')
+    def create(fuse):
+        validator = CSVValidator(field_names)
+        for k, regex in enumerate((r'[0-9]+$', r'\d{2}', r'1', r'(\d)\1',
+                                   r'[0-9]*$')):
+            check = match_pattern(regex)
+            if not fuse:
+                del check.pattern
+            validator.add_value_check('foo', check, 'P%s' % k)
+        validator.add_value_check('bar', match_pattern('x'), 'P5')
+        validator.add_value_check('foo', match_pattern('[0-9]+'), 'P6',
+                                  modulus=2)
+        return validator
+
+    data = (
+            ('foo', 'bar'),
+            ('123', 'x'),
+            ('11', 'y'),
+            ('2', 'x'),
+            ('abc', 'x'),
+            (None, 'x'),
+            ('', 'x'),
+            ('110', 'x')
+            )
+
+    validator = create(True)
+    checks = validator.compile().value_checks.items
+    assert [item[2] for item in checks][:5] != \
+        [t[1] for t in validator._value_checks][:5] # fused
+    assert checks[3][2] is validator._value_checks[3][1] # backreference
+    assert checks[5][2] is validator._value_checks[5][1] # other field
+    assert checks[6][2] is validator._value_checks[6][1] # other modulus
+
+    def key(p):
+        return (p['row'], p['code'], p.get('column'))
+    for method in 'validate', 'validate_columns':
+        expected = sorted(getattr(create(False), method)(data), key=key)
+        problems = sorted(getattr(create(True), method)(data), key=key)
+        assert len(problems) == len(expected) > 0
+        for p, e in zip(problems, expected):
+            assert key(p) == key(e)
+            assert p.get('value') == e.get('value')
+
+
+def test_validate_file():
+    """Test the validate_file() function."""
+
+    import csvvalidator
+
+    validator = CSVValidator(('foo', 'bar'))
+    validator.add_header_check()
+    validator.add_record_length_check()
+    validator.add_value_check('foo', int)
+
+    content = ('foo,bar\r\n'
+               '1,a\r\n'
+               'x,b\r\n'
+               '\r\n'
+               '"3","c\r\nd"\r\n'
+               'y,"e"\r\n'
+               '5,f,g\r\n')
+    offsets = [content.index('x,b'), content.index('\r\n\r\n') + 2,
+               content.index('y,'), content.index('5,f')]
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content.encode('ascii'))
+        with open(path, 'rb') as f:
+            expectation = validator.validate(csv.reader(f))
+        assert len(expectation) == 4, expectation
+        original = csvvalidator._FILE_BUFFER_SIZE
+        # small blocks mix blocks split at once with lines read by csv
+        for buffer_size in original, 1, 16:
+            csvvalidator._FILE_BUFFER_SIZE = buffer_size
+            try:
+                problems = validator.validate_file(path)
+            finally:
+                csvvalidator._FILE_BUFFER_SIZE = original
+            assert [dict(p) for p in expectation] == [
+                dict((k, p[k]) for k in p if k != 'offset') for p in problems]
+            assert [p['offset'] for p in problems] == offsets
+
+        problems = validator.validate_file(path, record_policy='offset')
+        assert [p['offset'] for p in problems] == offsets
+        assert [p['record'] for p in problems] == [
+            p['record'] for p in expectation]
+        problems = validator.validate_file(path, summarize=True)
+        assert [dict(p) for p in problems] == [{'code': p['code']}
+                                               for p in expectation]
+        problems = validator.validate_file(path, delimiter=';')
+        assert problems[0]['code'] == HEADER_CHECK_FAILED
+
+        # lines may end with carriage returns alone
+        content = content.replace('\r\n', '\r')
+        offsets = [content.index('x,b'), content.index('\r\r') + 1,
+                   content.index('y,'), content.index('5,f')]
+        with open(path, 'wb') as f:
+            f.write(content.encode('ascii'))
+        expectation = validator.validate(csv.reader(content.splitlines(True)))
+        assert len(expectation) == 4, expectation
+        for buffer_size in original, 1, 16:
+            csvvalidator._FILE_BUFFER_SIZE = buffer_size
+            try:
+                problems = validator.validate_file(path)
+            finally:
+                csvvalidator._FILE_BUFFER_SIZE = original
+            assert [dict(p) for p in expectation] == [
+                dict((k, p[k]) for k in p if k != 'offset') for p in problems]
+            assert [p['offset'] for p in problems] == offsets
+        problems = validator.validate_file(path, record_policy='offset')
+        assert [p['record'] for p in problems] == [
+            p['record'] for p in expectation]
+    finally:
+        os.remove(path)
+
+
+def test_duplicate_field_names():
+    """Test checks on a field name which is repeated in the header."""
+
+    validator = CSVValidator(('a', 'b', 'a'))
+    validator.add_value_check('a', int, 'X1')
+    validator.add_unique_check('a', 'X2')
+    def check(r):
+        if r['a'] != 'z':
+            raise RecordError('X3')
+    validator.add_record_check(check)
+
+    data = (
+            ('a', 'b', 'a'),
+            ('1', 'x', 'y'),
+            ('q', 'x', 'z'),
+            ('1', 'x', 'z')
+            )
+
+    # value and unique checks apply to the first column of that name, but
+    # records as dictionaries have the value in the last, as before
+    problems = validator.validate(data)
+    assert [(p['code'], p['row'], p.get('value')) for p in problems] == [
+        ('X3', 2, None), ('X1', 3, 'q'), ('X2', 4, '1')]
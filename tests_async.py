@@ -0,0 +1,171 @@
+"""
+Tests for asynchronous validation with the `csvvalidator` module, which require
+Python 3.6 or later.
+
+"""
+
+
+import asyncio
+
+from csvvalidator import CSVValidator, RecordError, depends_on,\
+    VALUE_CHECK_FAILED, UNEXPECTED_EXCEPTION, RECORD_PREDICATE_FALSE
+
+
+def test_aivalidate():
+    """Test asynchronous validation with coroutine check functions."""
+
+    awaiting = [0, 0] # current and maximum number of calls being awaited
+    suspend = [True]
+
+    async def pause():
+        if suspend[0]:
+            awaiting[0] += 1
+            awaiting[1] = max(awaiting)
+            await asyncio.sleep(0.001)
+            awaiting[0] -= 1
+
+    async def check_foo(v):
+        await pause()
+        int(v)
+
+    async def check_record(r):
+        await pause()
+        if r['bar'] == '3':
+            raise RecordError('X1')
+
+    async def foo_is_small(r):
+        await pause()
+        return int(r['foo']) < 10
+
+    def make_validator(*functions):
+        validator = CSVValidator(('foo', 'bar'))
+        validator.add_value_check('foo', functions[0])
+        validator.add_value_check('bar', int, modulus=2)
+        validator.add_record_check(functions[1])
+        validator.add_record_predicate(functions[2])
+        validator.add_unique_check('bar', 'X2')
+        validator.add_skip(lambda r: r[1] == 'skip')
+        return validator
+
+    data = [('foo', 'bar')]
+    data.extend((str(i) if i % 7 else 'x', str(i % 5) if i != 8 else 'skip')
+                for i in range(20))
+
+    async def rows():
+        for r in data:
+            yield r
+
+    async def collect(validator, **kwargs):
+        return [p async for p in validator.aivalidate(rows(), **kwargs)]
+
+    validator = make_validator(check_foo, check_record, foo_is_small)
+    loop = asyncio.new_event_loop()
+    try:
+        problems = loop.run_until_complete(collect(validator, concurrency=4,
+                                                   window=5))
+    finally:
+        loop.close()
+    assert 1 < awaiting[1] <= 4, awaiting
+
+    # the same checks applied synchronously find the same problems
+    def sync(f):
+        def wrapper(arg):
+            coroutine = f(arg)
+            try:
+                coroutine.send(None)
+            except StopIteration as e:
+                return e.value
+            raise AssertionError('coroutine did not finish')
+        wrapper.__name__ = f.__name__
+        return wrapper
+    suspend[0] = False
+    expectation = make_validator(sync(check_foo), sync(check_record),
+                                 sync(foo_is_small)).validate(data)
+    assert len(expectation) > 20, expectation
+    key = lambda p: (p['row'], p['code'], p.get('function'))
+    assert [key(p) for p in problems] == [key(p) for p in expectation]
+    assert [p.get('value') for p in problems] == \
+        [p.get('value') for p in expectation]
+
+    assert problems[0]['value'] == 'x'
+    assert problems[1]['function'] == 'foo_is_small: None'
+
+    # coroutine functions are not applied synchronously
+    for method in ('validate', 'summarize', 'validate_columns'):
+        try:
+            getattr(validator, method)(data)
+        except TypeError as e:
+            assert 'aivalidate' in str(e), e
+            assert 'check_foo' in str(e), e
+        else:
+            assert False, method
+
+
+def test_aivalidate_depends_on():
+    """Test coroutine record level functions are not awaited on failed values."""
+
+    awaited = list()
+
+    async def check_foo(v):
+        await asyncio.sleep(0)
+        if v.startswith('-'):
+            raise ValueError(v)
+
+    @depends_on('foo', 'bar')
+    async def check_record(r):
+        awaited.append(r['foo'])
+        await asyncio.sleep(0)
+        sync_check_record(r)
+
+    @depends_on('foo')
+    async def foo_is_small(r):
+        awaited.append(r['foo'])
+        await asyncio.sleep(0)
+        return sync_foo_is_small(r)
+
+    def sync_check_foo(v):
+        if v.startswith('-'):
+            raise ValueError(v)
+
+    @depends_on('foo', 'bar')
+    def sync_check_record(r):
+        if r['bar'] == '3':
+            raise RecordError('X1')
+
+    @depends_on('foo')
+    def sync_foo_is_small(r):
+        return int(r['foo']) < 10
+
+    def make_validator(*functions):
+        validator = CSVValidator(('foo', 'bar'))
+        validator.add_value_check('foo', int)
+        validator.add_value_check('foo', functions[0])
+        validator.add_value_predicate('bar', lambda v: v != '4')
+        validator.add_record_check(functions[1])
+        validator.add_record_predicate(functions[2])
+        return validator
+
+    data = [('foo', 'bar')]
+    data.extend((str(i) if i % 7 else ('x', '-1')[i % 2], str(i % 5))
+                for i in range(20))
+
+    async def collect(validator):
+        return [p async for p in validator.aivalidate(data, window=5)]
+
+    loop = asyncio.new_event_loop()
+    try:
+        problems = loop.run_until_complete(collect(make_validator(
+            check_foo, check_record, foo_is_small)))
+    finally:
+        loop.close()
+    # not awaited where foo is not a positive integer, nor check_record where
+    # bar is 4
+    assert sorted(awaited) == sorted(
+            [str(i) for i in range(20) if i % 7] +
+            [str(i) for i in range(20) if i % 7 and i % 5 != 4]), awaited
+
+    expectation = make_validator(sync_check_foo, sync_check_record,
+                                 sync_foo_is_small).validate(data)
+    key = lambda p: (p['row'], p['code'], p.get('value'))
+    assert [key(p) for p in problems] == [key(p) for p in expectation]
+    assert any(p['code'] == 'X1' for p in problems), problems